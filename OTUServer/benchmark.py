@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+# stdlib
+import argparse
+import re
+import selectors
+import socket
+import time
+from typing import List
+
+HEADERS_END = b"\r\n\r\n"
+CONTENT_LENGTH = re.compile(rb"\r\ncontent-length[ \t]*:[ \t]*(\d+)", re.IGNORECASE)
+CONNECTION_CLOSE = re.compile(rb"\r\nconnection[ \t]*:[ \t]*close", re.IGNORECASE)
+
+
+class Client:
+    """Соединение генератора нагрузки: отправка запросов и чтение ответов по Content-Length"""
+
+    def __init__(self, address: tuple, request: bytes):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        self.sock.connect_ex(address)
+        self.request = request
+        self.response = bytearray()
+        self.sent = 0
+        self.start = time.perf_counter()
+
+    def get_response_size(self) -> int or None:
+        """
+        Размер первого ответа в буфере.
+
+        :return: размер ответа или None, если ответ получен не полностью
+        """
+        end = self.response.find(HEADERS_END)
+        if end == -1:
+            return None
+        found = CONTENT_LENGTH.search(self.response, 0, end)
+        size = end + len(HEADERS_END) + (int(found.group(1)) if found else 0)
+        return size if len(self.response) >= size else None
+
+
+def run_load(host: str, port: int, path: str, requests: int, concurrency: int, keep_alive: bool = False) -> dict:
+    """
+    Нагрузка на сервер: concurrency одновременных соединений.
+
+    :param host: адрес сервера
+    :param port: порт сервера
+    :param path: путь запроса
+    :param requests: общее количество запросов
+    :param concurrency: количество одновременных соединений
+    :param keep_alive: запросы по постоянным соединениям (иначе одно соединение на запрос)
+    :return: статистика: запросов в секунду, задержки, ошибки, ответы не 2xx и число соединений
+    """
+    address = (host, port)
+    connection = "keep-alive" if keep_alive else "close"
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: {connection}\r\n\r\n".encode()
+    selector = selectors.DefaultSelector()
+    latencies: List[float] = []
+    failed, non_2xx, started, connections = 0, 0, 0, 0
+
+    def start_request(client: Client = None) -> None:
+        nonlocal started, failed, connections
+        started += 1
+        if client is None:
+            try:
+                client = Client(address, request)
+            except OSError:
+                failed += 1
+                return
+            connections += 1
+            selector.register(client.sock, selectors.EVENT_WRITE, client)
+        else:
+            client.sent, client.start = 0, time.perf_counter()
+            selector.modify(client.sock, selectors.EVENT_WRITE, client)
+
+    def close_client(client: Client) -> None:
+        selector.unregister(client.sock)
+        client.sock.close()
+
+    def finish_request(client: Client, size: int or None) -> None:
+        nonlocal failed, non_2xx
+        if size is None:
+            failed += 1
+            close_client(client)
+            client = None
+        else:
+            latencies.append(time.perf_counter() - client.start)
+            if not client.response.startswith(b"HTTP/1.1 2") and not client.response.startswith(b"HTTP/1.0 2"):
+                non_2xx += 1
+            reuse = keep_alive and not CONNECTION_CLOSE.search(client.response, 0, client.response.find(HEADERS_END))
+            del client.response[:size]
+            if not reuse or started >= requests:
+                close_client(client)
+                client = None
+        if started < requests:
+            start_request(client)
+
+    begin = time.perf_counter()
+    for _ in range(min(concurrency, requests)):
+        start_request()
+    while selector.get_map():
+        for key, mask in selector.select(timeout=10):
+            client = key.data
+            try:
+                if mask & selectors.EVENT_WRITE:
+                    client.sent += client.sock.send(request[client.sent :])
+                    if client.sent == len(request):
+                        selector.modify(client.sock, selectors.EVENT_READ, client)
+                else:
+                    chunk = client.sock.recv(65536)
+                    if not chunk:
+                        finish_request(client, None)
+                        continue
+                    client.response += chunk
+                    size = client.get_response_size()
+                    if size is not None:
+                        finish_request(client, size)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                finish_request(client, None)
+    elapsed = time.perf_counter() - begin
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "connections": connections,
+        "complete": len(latencies),
+        "failed": failed,
+        "non_2xx": non_2xx,
+        "rps": len(latencies) / elapsed,
+        "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0,
+        "p50_ms": 1000 * latencies[len(latencies) // 2] if latencies else 0,
+        "p99_ms": 1000 * latencies[int(len(latencies) * 0.99)] if latencies else 0,
+    }
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-addr", "--address", type=str, default="127.0.0.1", help="server address: 127.0.0.1")
+    parser.add_argument("-port", "--port", type=int, default=9000, help="server port: 9000")
+    parser.add_argument("-p", "--path", type=str, default="/httptest/dir2/page.html", help="request path")
+    parser.add_argument("-n", "--requests", type=int, default=10000, help="requests: 10000")
+    parser.add_argument("-c", "--concurrency", type=int, default=100, help="concurrent connections: 100")
+    parser.add_argument("-k", "--keep_alive", action="store_true", help="reuse connections (HTTP keep-alive)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    stat = run_load(args.address, args.port, args.path, args.requests, args.concurrency, args.keep_alive)
+    print(
+        f"{stat['complete']} of {stat['requests']} requests, concurrency {stat['concurrency']}, "
+        f"{stat['connections']} connections: {stat['rps']:.0f} req/sec, latency mean {stat['mean_ms']:.1f} ms, "
+        f"p50 {stat['p50_ms']:.1f} ms, p99 {stat['p99_ms']:.1f} ms, "
+        f"failed {stat['failed']}, non-2xx {stat['non_2xx']}"
+    )
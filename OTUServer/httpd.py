@@ -2,13 +2,31 @@
 import argparse
 import logging
 import os
+import selectors
+import signal
 import socket
+import sys
 import threading
+import time
 from multiprocessing import Process
-from typing import Callable
+from multiprocessing.connection import wait
+from typing import Callable, Dict, Set, Tuple
 
 # project
-from request import Request
+from request import ERROR_BAD_REQUEST, Request, RequestError, RequestReader
+
+RECV_SIZE = 65536
+# предельное ожидание данных начатого запроса или отправки ответа, секунды
+READ_TIMEOUT = 30.0
+# ожидание следующего запроса в постоянном соединении (0 - без keep-alive), секунды
+KEEP_ALIVE_TIMEOUT = 5.0
+# предельное число запросов в одном постоянном соединении
+MAX_KEEP_ALIVE_REQUESTS = 100
+# период проверки тайм-аутов соединений событийного сервера, секунды
+SWEEP_INTERVAL = 1.0
+SERVER_MODES = ("thread", "event")
+# воркер, завершившийся быстрее этого интервала, перезапускается с такой же паузой
+RESTART_DELAY = 1.0
 
 
 class Server:
@@ -19,14 +37,24 @@ class Server:
         max_connections: int = 1000,
         document_root: str = "",
         workers: int = 1,
+        sock: socket.socket = None,
+        reuse_port: bool = False,
+        keep_alive_timeout: float = KEEP_ALIVE_TIMEOUT,
+        max_requests: int = MAX_KEEP_ALIVE_REQUESTS,
     ):
-        self.server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.server_sock = sock
         self.address = address
         self.port = port
         self.max_connections = max_connections
         self.document_root = document_root
         self.workers = workers
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_requests = max_requests
 
     def bind(self):
         self.server_sock.bind((self.address, self.port))
@@ -49,28 +77,287 @@ class Server:
             thread.start()
 
     def request_handler(self, client_socket: socket.socket, client_address: tuple) -> None:
-        data = self.receive_data(client_socket)
-        if data:
-            logging.info("Received message: %s", data)
-            response = Request(data, self.document_root).get_response()
-            client_socket.sendall(response)
+        """
+        Обслуживание соединения: запросы читаются и обрабатываются по очереди,
+        пока клиент и сервер поддерживают постоянное соединение.
+        Запросы, присланные подряд без ожидания ответа (pipelining),
+        остаются в буфере reader и обрабатываются в порядке поступления.
+        """
+        reader = RequestReader()
+        served = 0
+        try:
+            while True:
+                timeout = self.keep_alive_timeout if served else READ_TIMEOUT
+                try:
+                    data = self.receive_data(client_socket, reader, timeout)
+                    keep_alive = self.is_keep_alive_allowed(served + 1)
+                    response, keep_alive = self.get_response(data, keep_alive) if data else (None, False)
+                except RequestError as e:
+                    logging.error("Bad request from %s: %s", client_address, e)
+                    response, keep_alive = self.get_error_response(ERROR_BAD_REQUEST), False
+                if response:
+                    client_socket.sendall(response)
+                served += 1
+                if not keep_alive:
+                    break
+        except OSError as e:
+            logging.error("Send error to %s: %s", client_address, e)
+        finally:
             client_socket.close()
 
+    def is_keep_alive_allowed(self, served: int) -> bool:
+        """
+        Проверка, может ли соединение остаться открытым после ответа.
+
+        :param served: количество запросов соединения с учётом текущего
+        :return: признак постоянного соединения
+        """
+        return self.keep_alive_timeout > 0 and served < self.max_requests
+
+    def get_response(self, data: bytes, keep_alive: bool = False) -> Tuple[bytes or None, bool]:
+        """
+        Формирование ответа на полученный запрос.
+
+        :param data: байты запроса
+        :param keep_alive: сервер готов оставить соединение открытым
+        :return: ответ или None, если запрос не удалось разобрать,
+                 и признак постоянного соединения
+        """
+        logging.info("Received message: %s", data)
+        try:
+            request = Request(data, self.document_root)
+            return request.get_response(keep_alive), request.keep_alive
+        except Exception as e:
+            logging.error("Bad request: %s, %s", type(e), e.args)
+            return None, False
+
+    def get_error_response(self, error_code: int) -> bytes:
+        """
+        Формирование ответа с ошибкой, после которого соединение закрывается.
+
+        :param error_code: код ошибки
+        :return: ответ
+        """
+        return Request(b"", self.document_root).get_error_response(error_code)
+
     @staticmethod
-    def receive_data(sock: socket.socket) -> bytes:
-        response = b""
-        sock.settimeout(0.01)
+    def receive_data(sock: socket.socket, reader: RequestReader = None, timeout: float = READ_TIMEOUT) -> bytes:
+        """
+        Чтение одного запроса: до конца заголовков и тела по Content-Length.
+
+        :param sock: сокет клиента
+        :param reader: буфер соединения (None - новый)
+        :param timeout: ожидание начала запроса, секунды; начатый запрос ждёт READ_TIMEOUT
+        :return: байты запроса или b"", если клиент закрыл соединение,
+                 не прислал запрос вовремя или произошла ошибка чтения
+        :raise RequestError: запрос превышает допустимый размер
+        """
+        reader = reader or RequestReader()
         try:
             while True:
-                chunk = sock.recv(4096)
+                request = reader.next_request()
+                if request is not None:
+                    return request
+                sock.settimeout(READ_TIMEOUT if reader.buffer else timeout)
+                chunk = sock.recv(RECV_SIZE)
                 if not chunk:
-                    break
-                response += chunk
-        except TimeoutError:
-            pass
+                    return b""
+                reader.feed(chunk)
+        except OSError:
+            return b""
         finally:
             sock.settimeout(None)
-            return response
+
+
+class Connection:
+    """
+    Состояние соединения событийного сервера: чтение запроса, запись ответа,
+    затем (в постоянном соединении) ожидание следующего запроса.
+    """
+
+    def __init__(self, sock: socket.socket, address: tuple, deadline: float):
+        self.sock = sock
+        self.address = address
+        self.reader = RequestReader()
+        self.response = memoryview(b"")
+        self.sent = 0
+        self.keep_alive = False
+        self.served = 0
+        self.events = selectors.EVENT_READ
+        self.deadline = deadline
+
+    def read(self) -> bool:
+        """
+        Чтение доступных данных запроса без блокировки.
+
+        :return: False - клиент закрыл соединение или произошла ошибка
+        """
+        try:
+            chunk = self.sock.recv(RECV_SIZE)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        if not chunk:
+            return False
+        self.reader.feed(chunk)
+        return True
+
+    def write(self) -> bool or None:
+        """
+        Отправка очередной части ответа без блокировки.
+
+        :return: True - ответ отправлен целиком, False - осталась неотправленная часть,
+                 None - ошибка отправки
+        """
+        try:
+            self.sent += self.sock.send(self.response[self.sent :])
+        except BlockingIOError:
+            return False
+        except OSError:
+            return None
+        return self.sent == len(self.response)
+
+
+class SelectorServer(Server):
+    """
+    Событийный сервер: все соединения обслуживаются в одном потоке
+    через selectors (epoll в Linux), у каждого соединения свой объект Connection.
+    Соединения, не приславшие запрос или не принявшие ответ вовремя, закрываются.
+    """
+
+    def run(self):
+        self.server_sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server_sock, selectors.EVENT_READ)
+        self.connections: Set[Connection] = set()
+        swept = time.monotonic()
+        while True:
+            for key, mask in self.selector.select(SWEEP_INTERVAL):
+                if key.data is None:
+                    self.accept()
+                elif mask & selectors.EVENT_READ:
+                    self.on_read(key.data)
+                else:
+                    self.on_write(key.data)
+            now = time.monotonic()
+            if now - swept >= SWEEP_INTERVAL:
+                self.sweep(now)
+                swept = now
+
+    def accept(self) -> None:
+        """Приём всех ожидающих соединений"""
+        while True:
+            try:
+                client_socket, client_address = self.server_sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logging.error("Accept error: %s", e)
+                return
+            client_socket.setblocking(False)
+            conn = Connection(client_socket, client_address, time.monotonic() + READ_TIMEOUT)
+            self.selector.register(client_socket, selectors.EVENT_READ, conn)
+            self.connections.add(conn)
+
+    def on_read(self, conn: Connection) -> None:
+        """
+        Обработка готовности соединения к чтению.
+
+        :param conn: соединение
+        """
+        if not conn.read():
+            self.close(conn)
+            return
+        if conn.reader.buffer:
+            conn.deadline = time.monotonic() + READ_TIMEOUT
+        self.process(conn)
+
+    def process(self, conn: Connection) -> None:
+        """
+        Обработка запросов из буфера соединения по одному:
+        следующий запрос берётся только после отправки ответа на предыдущий.
+
+        :param conn: соединение
+        """
+        while True:
+            try:
+                request = conn.reader.next_request()
+            except RequestError as e:
+                logging.error("Bad request from %s: %s", conn.address, e)
+                conn.response, conn.keep_alive = memoryview(self.get_error_response(ERROR_BAD_REQUEST)), False
+            else:
+                if request is None:
+                    self.set_events(conn, selectors.EVENT_READ)
+                    return
+                conn.served += 1
+                response, conn.keep_alive = self.get_response(request, self.is_keep_alive_allowed(conn.served))
+                if response is None:
+                    self.close(conn)
+                    return
+                conn.response = memoryview(response)
+            conn.sent = 0
+            conn.deadline = time.monotonic() + READ_TIMEOUT
+            if not self.send(conn):
+                return
+
+    def on_write(self, conn: Connection) -> None:
+        """
+        Обработка готовности соединения к записи.
+
+        :param conn: соединение
+        """
+        if self.send(conn):
+            self.process(conn)
+
+    def send(self, conn: Connection) -> bool:
+        """
+        Отправка ответа; после полной отправки соединение закрывается
+        или переходит к ожиданию следующего запроса.
+
+        :param conn: соединение
+        :return: True - ответ отправлен и соединение готово к следующему запросу
+        """
+        sent = conn.write()
+        if sent is None or (sent and not conn.keep_alive):
+            self.close(conn)
+            return False
+        if not sent:
+            self.set_events(conn, selectors.EVENT_WRITE)
+            return False
+        conn.deadline = time.monotonic() + (READ_TIMEOUT if conn.reader.buffer else self.keep_alive_timeout)
+        return True
+
+    def set_events(self, conn: Connection, events: int) -> None:
+        """
+        Смена ожидаемых событий соединения.
+
+        :param conn: соединение
+        :param events: события selectors
+        """
+        if conn.events != events:
+            self.selector.modify(conn.sock, events, conn)
+            conn.events = events
+
+    def sweep(self, now: float) -> None:
+        """
+        Закрытие соединений с истёкшим тайм-аутом.
+
+        :param now: текущее время time.monotonic()
+        """
+        for conn in [conn for conn in self.connections if conn.deadline < now]:
+            logging.info("Connection timeout: %s", conn.address)
+            self.close(conn)
+
+    def close(self, conn: Connection) -> None:
+        """
+        Закрытие соединения.
+
+        :param conn: соединение
+        """
+        self.selector.unregister(conn.sock)
+        self.connections.discard(conn)
+        conn.sock.close()
 
 
 def get_args():
@@ -78,37 +365,107 @@ def get_args():
     parser.add_argument("-addr", "--address", type=str, help="server address: 0.0.0.0")
     parser.add_argument("-port", "--port", type=int, help="server port: 9000")
     parser.add_argument("-r", "--document_root", type=str, help="document root path: /OTUServer")
-    parser.add_argument("-w", "--workers", type=int, help="workers: 4")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="workers: 4")
+    parser.add_argument("-m", "--mode", choices=SERVER_MODES, default="thread", help="server core: thread / event")
+    parser.add_argument("--reuseport", action="store_true", help="per-worker sockets with SO_REUSEPORT")
+    parser.add_argument(
+        "-k", "--keep_alive", type=float, default=KEEP_ALIVE_TIMEOUT, help="keep-alive idle timeout, 0 - disabled: 5"
+    )
+    parser.add_argument(
+        "--max_requests", type=int, default=MAX_KEEP_ALIVE_REQUESTS, help="requests per keep-alive connection: 100"
+    )
     args = parser.parse_args()
     return args
 
 
-def run_server(addr: str, port: int, document_root: str, shift: int):
-    """Функция для запуска сервера в multiprocessing"""
-    logging.info(f"Worker {shift} run at process id: {os.getpid()}")
-    server = Server(addr, port + shift, document_root=document_root)
-    server.bind()
+def run_server(
+    addr: str,
+    port: int,
+    document_root: str,
+    worker: int,
+    mode: str = "thread",
+    sock: socket.socket = None,
+    keep_alive_timeout: float = KEEP_ALIVE_TIMEOUT,
+    max_requests: int = MAX_KEEP_ALIVE_REQUESTS,
+):
+    """
+    Функция для запуска сервера в multiprocessing.
+    Воркер принимает соединения с общего слушающего сокета sock,
+    без него - со своего сокета с SO_REUSEPORT на том же порту.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    logging.info(f"Worker {worker} ({mode}) run at process id: {os.getpid()}")
+    server_class = SelectorServer if mode == "event" else Server
+    server = server_class(
+        addr,
+        port,
+        document_root=document_root,
+        sock=sock,
+        reuse_port=sock is None,
+        keep_alive_timeout=keep_alive_timeout,
+        max_requests=max_requests,
+    )
+    if sock is None:
+        server.bind()
     server.run()
 
 
-def run_workers(func: Callable, workers: int, addr: str, port: int, document_root: str):
-    """Функция запуска процессов по заданному числу workers"""
-    procs = []
-    for i in range(workers):
+def run_workers(
+    func: Callable,
+    workers: int,
+    addr: str,
+    port: int,
+    document_root: str,
+    mode: str = "thread",
+    reuse_port: bool = False,
+    keep_alive_timeout: float = KEEP_ALIVE_TIMEOUT,
+    max_requests: int = MAX_KEEP_ALIVE_REQUESTS,
+):
+    """
+    Функция запуска процессов по заданному числу workers (pre-fork).
+    Все воркеры принимают соединения на одном порту: с общего сокета,
+    открытого до запуска воркеров, или (reuse_port) каждый со своего сокета
+    с SO_REUSEPORT, между которыми ядро распределяет соединения.
+    Завершившийся воркер перезапускается; по SIGTERM или SIGINT воркеры останавливаются.
+    """
+    sock = None
+    if not reuse_port:
+        server = Server(addr, port)
+        server.bind()
+        sock = server.server_sock
+
+    def start_worker(worker: int) -> Process:
         p = Process(
             target=func,
-            args=(
-                addr,
-                port,
-                document_root,
-                i,
-            ),
+            args=(addr, port, document_root, worker, mode, sock, keep_alive_timeout, max_requests),
+            daemon=True,
         )
-        procs.append(p)
         p.start()
+        return p
 
-    for p in procs:
-        p.join()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    procs: Dict[int, Process] = {}
+    started: Dict[int, float] = {}
+    try:
+        for i in range(workers):
+            procs[i], started[i] = start_worker(i), time.monotonic()
+        while True:
+            wait([p.sentinel for p in procs.values()])
+            for i, p in procs.items():
+                if p.exitcode is None:
+                    continue
+                logging.error("Worker %i (pid %i) exited with code %s, restarting", i, p.pid, p.exitcode)
+                if time.monotonic() - started[i] < RESTART_DELAY:
+                    time.sleep(RESTART_DELAY)
+                procs[i], started[i] = start_worker(i), time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in procs.values():
+            p.terminate()
+        for p in procs.values():
+            p.join()
+        logging.info("Workers stopped")
 
 
 if __name__ == "__main__":
@@ -117,6 +474,10 @@ if __name__ == "__main__":
     addr = args.address
     port = args.port
     workers = args.workers
+    mode = args.mode
+    reuse_port = args.reuseport
+    keep_alive_timeout = args.keep_alive
+    max_requests = args.max_requests
 
     logging.basicConfig(
         format="[%(asctime)s] %(levelname).1s:%(message)s",
@@ -125,4 +486,4 @@ if __name__ == "__main__":
         filename=None,
     )
 
-    run_workers(run_server, workers, addr, port, document_root)
+    run_workers(run_server, workers, addr, port, document_root, mode, reuse_port, keep_alive_timeout, max_requests)
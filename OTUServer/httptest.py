@@ -4,6 +4,7 @@
 import http.client
 import re
 import socket
+import time
 import unittest
 
 
@@ -137,6 +138,65 @@ class HttpServer(unittest.TestCase):
         r = self.conn.getresponse()
         self.assertIn(int(r.status), (400, 405))
 
+    def test_slow_client(self):
+        """request headers sent in parts"""
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.connect((self.host, self.port))
+        for part in (b"GET /httptest/dir2/page.html HTTP/1.0\r\n", b"Host: localhost\r\n", b"\r\n"):
+            s.sendall(part)
+            time.sleep(0.1)
+        data = s.recv(1024)
+        s.close()
+        self.assertTrue(data.startswith(b"HTTP/1.1 200 OK\r\n"))
+
+    def test_request_body(self):
+        """request body read by Content-Length"""
+        self.conn.request("POST", "/httptest/dir2/page.html", body=b"x" * 100000)
+        r = self.conn.getresponse()
+        self.assertIn(int(r.status), (400, 405))
+
+    def test_headers_too_large(self):
+        """oversized request headers rejected"""
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.connect((self.host, self.port))
+        try:
+            s.sendall(b"GET /httptest/dir2/page.html HTTP/1.0\r\nX-Big: " + b"x" * 100000 + b"\r\n\r\n")
+            data = s.recv(1024)
+        except ConnectionResetError:
+            data = b""
+        s.close()
+        self.assertTrue(data == b"" or data.startswith(b"HTTP/1.1 400 "))
+
+    def test_keep_alive(self):
+        """several requests over one HTTP/1.1 connection"""
+        for _ in range(3):
+            self.conn.request("GET", "/httptest/dir2/page.html")
+            r = self.conn.getresponse()
+            data = r.read()
+            self.assertEqual(int(r.status), 200)
+            self.assertEqual(len(data), 38)
+            self.assertEqual(r.getheader("Connection", "").lower(), "keep-alive")
+        self.assertFalse(r.will_close)
+
+    def test_pipelining(self):
+        """pipelined requests answered in order"""
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.connect((self.host, self.port))
+        s.sendall(
+            b"GET /httptest/dir2/page.html HTTP/1.1\r\nHost: localhost\r\n\r\n"
+            b"GET /httptest/smdklcdsmvdfjnvdfjvdfvdfvdsfssdmfdsdfsd.html HTTP/1.1\r\nHost: localhost\r\n\r\n"
+            b"HEAD /httptest/dir2/page.html HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+        )
+        data = b""
+        while 1:
+            buf = s.recv(1024)
+            if not buf:
+                break
+            data += buf
+        s.close()
+        statuses = re.findall(rb"HTTP/1\.1 (\d{3}) ", data)
+        self.assertEqual(statuses, [b"200", b"404", b"200"])
+
     def test_head_method(self):
         """head method support"""
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -3,20 +3,94 @@ import email
 import logging
 import mimetypes
 import os
+import re
 import urllib.parse
 from datetime import datetime
 from io import StringIO
 
 CODE_OK = 200
+ERROR_BAD_REQUEST = 400
 ERROR_FORBIDDEN = 403
 ERROR_NOT_FOUND = 404
 ERROR_NOT_ALLOWED = 405
 
+HEADERS_END = b"\r\n\r\n"
+MAX_HEADERS_SIZE = 65536
+MAX_BODY_SIZE = 1 << 20
+CONTENT_LENGTH = re.compile(rb"\r\ncontent-length[ \t]*:[ \t]*(\d+)[ \t]*(?=\r\n)", re.IGNORECASE)
+CHUNKED = re.compile(rb"\r\ntransfer-encoding[ \t]*:[^\r]*chunked", re.IGNORECASE)
+
+
+class RequestError(ValueError):
+    """Нарушение границ запроса: слишком большие заголовки или тело, неподдерживаемое кодирование тела"""
+
+
+class RequestReader:
+    """
+    Инкрементальное выделение запросов из потока байт соединения.
+    Запрос - заголовки до пустой строки и тело длиной Content-Length;
+    конец заголовков ищется только в новых данных, размер буфера ограничен.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.scanned = 0
+        self.size = None
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        Добавление полученных данных.
+
+        :param chunk: байты, прочитанные из сокета
+        """
+        self.buffer += chunk
+
+    def next_request(self) -> bytes or None:
+        """
+        Извлечение очередного полного запроса из буфера.
+
+        :return: байты запроса (заголовки и тело) или None, если запрос получен не полностью
+        :raise RequestError: заголовки длиннее MAX_HEADERS_SIZE, тело длиннее MAX_BODY_SIZE
+                             или тело в chunked-кодировании
+        """
+        if self.size is None:
+            end = self.buffer.find(HEADERS_END, max(self.scanned - len(HEADERS_END) + 1, 0))
+            self.scanned = len(self.buffer) if end == -1 else end
+            if self.scanned > MAX_HEADERS_SIZE:
+                raise RequestError("Request headers too large")
+            if end == -1:
+                return None
+            end += len(HEADERS_END)
+            self.size = end + self._get_body_size(bytes(self.buffer[:end]))
+        if len(self.buffer) < self.size:
+            return None
+        request = bytes(self.buffer[: self.size])
+        del self.buffer[: self.size]
+        self.scanned, self.size = 0, None
+        return request
+
+    @staticmethod
+    def _get_body_size(headers: bytes) -> int:
+        """
+        Длина тела запроса по заголовкам.
+
+        :param headers: заголовки запроса
+        :return: значение Content-Length (0 - без тела)
+        """
+        if CHUNKED.search(headers):
+            raise RequestError("Chunked request body is not supported")
+        found = CONTENT_LENGTH.search(headers)
+        size = int(found.group(1)) if found else 0
+        if size > MAX_BODY_SIZE:
+            raise RequestError("Request body too large")
+        return size
+
 
 class Request:
     ENABLED_METHODS = ("GET", "HEAD")
     HTTP_CODES = {
         CODE_OK: "OK",
+        ERROR_BAD_REQUEST: "Bad Request",
         ERROR_FORBIDDEN: "Forbidden",
         ERROR_NOT_FOUND: "Not Found",
         ERROR_NOT_ALLOWED: "Method Not Allowed",
@@ -25,17 +99,33 @@ class Request:
     def __init__(self, request_bytes: bytes, document_root: str):
         self.request_bytes = request_bytes
         self.document_root = document_root
+        self.keep_alive = False
 
-    def get_response(self) -> bytes:
+    def get_response(self, keep_alive: bool = False) -> bytes:
         """
         Получение ответа на запрос.
+        Итоговый признак постоянного соединения доступен в self.keep_alive.
 
+        :param keep_alive: сервер готов оставить соединение открытым
         :return: response - ответ на полученный запрос
         """
-        parsed_request_data = self._parse_request()
+        try:
+            parsed_request_data = self._parse_request()
+        except ValueError:
+            return self._get_error_message(ERROR_BAD_REQUEST)
+        self.keep_alive = keep_alive and self._is_keep_alive(parsed_request_data)
         response = self._form_response(parsed_request_data)
         return response
 
+    def get_error_response(self, error_code: int) -> bytes:
+        """
+        Получение ответа с ошибкой без разбора запроса.
+
+        :param error_code: код ошибки
+        :return: error_message - сообщение об ошибке
+        """
+        return self._get_error_message(error_code)
+
     def _parse_request(self) -> dict:
         """
         Извлечение данных из полученного запроса.
@@ -74,6 +164,20 @@ class Request:
 
         return self._get_error_message(ERROR_NOT_FOUND)
 
+    @staticmethod
+    def _is_keep_alive(req_data: dict) -> bool:
+        """
+        Проверка, просит ли клиент постоянное соединение:
+        в HTTP/1.1 - если нет Connection: close, в HTTP/1.0 - только с Connection: keep-alive.
+
+        :param req_data: извлеченные из запроса данные
+        :return: признак постоянного соединения
+        """
+        connection = req_data["headers"].get("Connection", "").lower()
+        if req_data["ver"] == "HTTP/1.1":
+            return "close" not in connection
+        return "keep-alive" in connection
+
     @staticmethod
     def _prepare_query(query: str) -> str:
         """
@@ -107,7 +211,7 @@ class Request:
                     f"Server: Python 3.10\r\n"
                     f"Content-Length: {content_len}\r\n"
                     f"Content-Type: {content_type}\r\n"
-                    f"Connection: Closed\r\n\r\n"
+                    f"Connection: {self._get_connection()}\r\n\r\n"
                 )
                 message = str.encode(message)
                 if method == "GET":
@@ -130,7 +234,16 @@ class Request:
             f"HTTP/1.1 {error_code} {error_descr}\r\n"
             f"Date: {date}\r\n"
             f"Server: Python 3.10\r\n"
-            f"Connection: Closed\r\n\r\n"
+            f"Content-Length: 0\r\n"
+            f"Connection: {self._get_connection()}\r\n\r\n"
         )
         logging.error("Response error status: %s", str(error_code))
         return str.encode(error_message)
+
+    def _get_connection(self) -> str:
+        """
+        Значение заголовка Connection ответа.
+
+        :return: keep-alive или close
+        """
+        return "keep-alive" if self.keep_alive else "close"
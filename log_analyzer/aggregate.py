@@ -0,0 +1,236 @@
+import math
+import statistics
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+MEDIAN_EXACT = "exact"
+MEDIAN_APPROX = "approx"
+MEDIAN_MODES = (MEDIAN_EXACT, MEDIAN_APPROX)
+
+# число значений, после которого агрегат в приближённом режиме переходит на скетч
+SKETCH_THRESHOLD = 128
+# request_time суммируется в целых миллисекундах (точность $request_time в nginx),
+# поэтому сумма не зависит от порядка сложения и разбиения лога на части
+TIME_SCALE = 1000
+
+
+class QuantileSketch:
+    """
+    Приближённая оценка квантилей с ограниченной памятью (в стиле DDSketch).
+    Значения раскладываются по логарифмическим корзинам, поэтому
+    относительная ошибка любого квантиля не превышает relative_accuracy,
+    а число корзин ограничено max_buckets. Скетчи объединяются сложением счётчиков.
+    """
+
+    __slots__ = ("relative_accuracy", "max_buckets", "gamma", "log_gamma", "buckets", "zero_cnt", "count")
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_cnt = 0
+        self.count = 0
+
+    def add(self, value: float, count: int = 1) -> None:
+        """
+        Добавление значения в скетч.
+        :param value: значение (неотрицательное)
+        :param count: количество повторений значения
+        """
+        self.count += count
+        if value <= 0:
+            self.zero_cnt += count
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """
+        Объединение со скетчем с той же точностью.
+        :param other: добавляемый скетч
+        """
+        if other.gamma != self.gamma:
+            raise ValueError("Невозможно объединить скетчи с разной точностью")
+        self.add_buckets(other.buckets.items(), other.zero_cnt)
+
+    def add_buckets(self, buckets: Iterable[Tuple[int, int]], zero_cnt: int = 0) -> None:
+        """
+        Добавление счётчиков корзин скетча с той же точностью.
+        :param buckets: пары (ключ корзины, количество значений)
+        :param zero_cnt: количество нулевых значений
+        """
+        self.count += zero_cnt
+        self.zero_cnt += zero_cnt
+        own = self.buckets
+        for key, cnt in buckets:
+            own[key] = own.get(key, 0) + cnt
+            self.count += cnt
+        if len(own) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> float:
+        """
+        Оценка квантиля.
+        :param q: уровень квантиля в диапазоне [0, 1]
+
+        :return: оценка значения квантиля
+        """
+        if not self.count:
+            raise ValueError("Скетч не содержит значений")
+        rank = q * (self.count - 1)
+        lower = self._value_at(math.floor(rank))
+        upper = self._value_at(math.ceil(rank))
+        return lower + (upper - lower) * (rank - math.floor(rank))
+
+    def _value_at(self, rank: int) -> float:
+        """
+        Оценка значения с заданным порядковым номером.
+        :param rank: порядковый номер значения (с нуля)
+
+        :return: середина корзины, в которую попало значение
+        """
+        seen = self.zero_cnt
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma**key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def _collapse(self) -> None:
+        """Слияние младших корзин для соблюдения ограничения max_buckets."""
+        keys = sorted(self.buckets)
+        excess = len(keys) - self.max_buckets
+        target = keys[excess]
+        for key in keys[:excess]:
+            self.buckets[target] += self.buckets.pop(key)
+
+
+class UrlStat:
+    """
+    Потоковый агрегат request_time по одному url.
+    Количество, сумма (в целых миллисекундах) и максимум хранятся за O(1) памяти.
+    Для медианы значения копятся в компактном array('d')
+    (8 байт на значение вместо ~32 байт у списка float).
+    В приближённом режиме после SKETCH_THRESHOLD значений буфер
+    заменяется на QuantileSketch ограниченного размера.
+    """
+
+    __slots__ = ("approx", "count", "time_ms", "time_max", "times", "sketch")
+
+    def __init__(self, median_mode: str = MEDIAN_EXACT):
+        if median_mode not in MEDIAN_MODES:
+            raise ValueError(f"Неизвестный режим расчёта медианы: {median_mode}")
+        self.approx = median_mode == MEDIAN_APPROX
+        self.count = 0
+        self.time_ms = 0
+        self.time_max = 0.0
+        self.times = array("d")
+        self.sketch = None
+
+    def add(self, request_time: float) -> None:
+        """
+        Учёт очередного значения request_time.
+        :param request_time: длительность обработки запроса
+        """
+        if not self.count or request_time > self.time_max:
+            self.time_max = request_time
+        self.count += 1
+        self.time_ms += round(request_time * TIME_SCALE)
+        if self.sketch is not None:
+            self.sketch.add(request_time)
+        else:
+            self.times.append(request_time)
+            if self.approx and len(self.times) > SKETCH_THRESHOLD:
+                self._to_sketch()
+
+    def merge(self, other: "UrlStat") -> None:
+        """
+        Объединение с агрегатом по тому же url.
+        :param other: добавляемый агрегат в том же режиме
+        """
+        if not other.count:
+            return
+        if not self.count or other.time_max > self.time_max:
+            self.time_max = other.time_max
+        self.count += other.count
+        self.time_ms += other.time_ms
+        if other.sketch is not None:
+            if self.sketch is None:
+                self._to_sketch()
+            self.sketch.merge(other.sketch)
+        elif self.sketch is not None:
+            for request_time in other.times:
+                self.sketch.add(request_time)
+        else:
+            self.times.extend(other.times)
+            if self.approx and len(self.times) > SKETCH_THRESHOLD:
+                self._to_sketch()
+
+    @property
+    def time_sum(self) -> float:
+        """
+        Сумма request_time.
+
+        :return: сумма в секундах
+        """
+        return self.time_ms / TIME_SCALE
+
+    @property
+    def time_avg(self) -> float:
+        """
+        Среднее request_time, округлённое до миллисекунд по точной сумме.
+
+        :return: среднее в секундах
+        """
+        return round(self.time_ms / self.count) / TIME_SCALE
+
+    def median(self) -> float:
+        """
+        Медиана request_time.
+
+        :return: точная или приближённая медиана
+        """
+        if self.sketch is not None:
+            return self.sketch.quantile(0.5)
+        return statistics.median(self.times)
+
+    def quantiles(self, levels: Iterable[float]) -> List[float]:
+        """
+        Квантили request_time с линейной интерполяцией между соседними значениями.
+        :param levels: уровни квантилей в диапазоне [0, 1]
+
+        :return: точные (по буферу значений) или приближённые (по скетчу) квантили
+        """
+        if self.sketch is not None:
+            return [self.sketch.quantile(level) for level in levels]
+        times = sorted(self.times)
+        result = []
+        for level in levels:
+            rank = level * (len(times) - 1)
+            lower = times[math.floor(rank)]
+            upper = times[math.ceil(rank)]
+            result.append(lower + (upper - lower) * (rank - math.floor(rank)))
+        return result
+
+    def _to_sketch(self) -> None:
+        """Перенос накопленных значений в скетч."""
+        self.sketch = QuantileSketch()
+        for request_time in self.times:
+            self.sketch.add(request_time)
+        self.times = None
+
+
+def get_full_time(requests: Dict[str, UrlStat]) -> float:
+    """
+    Общая длительность выполнения запросов по точным суммам агрегатов.
+    :param requests: словарь вида url: агрегат request_time
+
+    :return: сумма request_time в секундах
+    """
+    return sum(stat.time_ms for stat in requests.values()) / TIME_SCALE
@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import argparse
+import gzip
+import os
+import random
+import re
+import resource
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from log_format import UI_SHORT_FORMAT, LogFormatParser
+
+import log_analyzer
+
+LEGACY_REF_PATTERN = r"(GET|POST).*(HTTP)"
+
+SAMPLE_LINE = (
+    '1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] "GET /api/v2/banner/{banner} HTTP/1.1" 200 927 "-" '
+    '"Lynx/2.8.8dev.9 libwww-FM/2.14 SSL-MM/1.4.1 GNUTLS/2.10.5" "-" "1498697422-2190034393-4708-9752759" '
+    '"dc7161be3" {request_time:.3f}\n'
+)
+
+
+LOG_LINE = (
+    '{ip} -  - [{time_local}] "{method} {url} HTTP/1.1" {status} {size} "-" "{agent}" "-" '
+    '"{request_id}" "{user}" {request_time:.3f}\n'
+)
+LOG_URLS = (
+    "/api/v2/banner/{id}",
+    "/api/v2/group/{id}/statistic/sites/?date_type=day&date_from=2017-06-28",
+    "/api/v2/slot/{id}/groups",
+    "/api/1/photogenic_banners/list/?server_name=WIN7RB{id}",
+    "/export/appinstall_raw/2017-06-{id}/",
+    "/api/v2/internal/html5/phantomjs/queue/?wait=1m&id={id}",
+)
+LOG_AGENTS = (
+    "Lynx/2.8.8dev.9 libwww-FM/2.14 SSL-MM/1.4.1 GNUTLS/2.10.5",
+    "python-requests/2.13.0",
+    "Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/59.0.3071.115",
+)
+STAGES = ("read", "parse", "aggregate", "stat", "render")
+
+
+def generate_log(
+    path: str, lines: int, urls: int = 10000, error_rate: float = 0.0, seed: int = 0, date: datetime = None
+) -> int:
+    """
+    Генерация лога в формате ui_short (сжатого, если путь оканчивается на .gz).
+    url выбираются из urls различных значений с распределением, близким к Ципфу,
+    request_time - логнормальное, $time_local равномерно покрывает сутки.
+    :param path: путь до создаваемого файла
+    :param lines: количество строк
+    :param urls: число различных url
+    :param error_rate: доля нераспознаваемых строк
+    :param seed: начальное значение генератора
+    :param date: дата лога (по умолчанию 29.06.2017)
+
+    :return: размер несжатых данных в байтах
+    """
+    rnd = random.Random(seed)
+    date = date or datetime(2017, 6, 29)
+    weights = [1 / (rank + 1) for rank in range(urls)]
+    step, stamp_second, stamp = 86400 / max(lines, 1), None, None
+    size, batch = 0, []
+    log_file = gzip.open(path, "wb", compresslevel=6) if path.endswith(".gz") else open(path, "wb")
+    with log_file:
+        for i in range(lines):
+            if i % 10000 == 0:
+                url_ids = iter(rnd.choices(range(urls), weights=weights, k=10000))
+                if batch:
+                    data = b"".join(batch)
+                    size += len(data)
+                    log_file.write(data)
+                    batch = []
+            url_id = next(url_ids)
+            if error_rate and rnd.random() < error_rate:
+                line = "-- malformed line %i --\n" % i
+            else:
+                second = int(i * step)
+                if second != stamp_second:
+                    stamp_second = second
+                    stamp = (date + timedelta(seconds=second)).strftime("%d/%b/%Y:%H:%M:%S +0300")
+                line = LOG_LINE.format(
+                    ip=f"1.{url_id % 200}.{i % 250}.{url_id % 97}",
+                    time_local=stamp,
+                    method="POST" if url_id % 11 == 0 else "GET",
+                    url=LOG_URLS[url_id % len(LOG_URLS)].format(id=url_id),
+                    status=200 if url_id % 50 else 404,
+                    size=rnd.randrange(20, 30000),
+                    agent=LOG_AGENTS[url_id % len(LOG_AGENTS)],
+                    request_id=f"{1498697422 + second}-{rnd.randrange(1 << 31)}-4708-{i}",
+                    user=f"{url_id:x}",
+                    request_time=rnd.lognormvariate(-2.0, 1.0),
+                )
+            batch.append(line.encode())
+        data = b"".join(batch)
+        size += len(data)
+        log_file.write(data)
+    return size
+
+
+def get_peak_rss() -> int:
+    """
+    Пиковый размер резидентной памяти процесса.
+
+    :return: байты
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def bench_stages(path: str, report_size: int = 1000, formats: Tuple[str] = ("html",)) -> Dict[str, dict]:
+    """
+    Замер времени по этапам построения отчёта: чтение строк, парсинг, агрегация
+    (parse_log), расчёт показателей (calc_stat) и запись отчёта (save_report).
+    Время этапов parse и aggregate считается вычитанием: каждый следующий
+    проход по логу включает предыдущие этапы.
+    :param path: путь до лога (*.gz - сжатый)
+    :param report_size: размер отчёта
+    :param formats: форматы отчёта
+
+    :return: словарь вида этап: {"time", "peak_rss", ...}
+    """
+    is_gz = path.endswith(".gz")
+    log = log_analyzer.Log(datetime(2017, 6, 29), os.path.basename(path), os.path.dirname(path) or ".", is_gz)
+
+    def read() -> Iterable[bytes]:
+        if is_gz:
+            return log_analyzer.read_gzip(path)
+        return log_analyzer.read_chunk(path, 0, os.path.getsize(path))
+
+    start = time.perf_counter()
+    lines, size = 0, 0
+    for line in read():
+        lines += 1
+        size += len(line)
+    read_time = time.perf_counter() - start
+    stages = {"read": {"time": read_time, "lines": lines, "bytes": size, "peak_rss": get_peak_rss()}}
+
+    start = time.perf_counter()
+    parsed = sum(1 for line in read() if log_analyzer.parse_line(line))
+    parse_time = time.perf_counter() - start
+    stages["parse"] = {"time": max(parse_time - read_time, 0), "lines": parsed, "peak_rss": get_peak_rss()}
+
+    start = time.perf_counter()
+    result = log_analyzer.parse_log(log, log_analyzer.parse_line)
+    aggregate_time = time.perf_counter() - start
+    stages["aggregate"] = {
+        "time": max(aggregate_time - parse_time, 0),
+        "urls": len(result.requests),
+        "peak_rss": get_peak_rss(),
+    }
+
+    start = time.perf_counter()
+    report = log_analyzer.calc_stat(result.requests, result.full_time, result.full_cnt, report_size)
+    stages["stat"] = {"time": time.perf_counter() - start, "rows": len(report), "peak_rss": get_peak_rss()}
+
+    report_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(report_dir, "report.html"), "w") as template:
+            template.write("var table = $table_json;")
+        start = time.perf_counter()
+        log_analyzer.save_report(log, report, report_dir, report_size, formats)
+        stages["render"] = {"time": time.perf_counter() - start, "peak_rss": get_peak_rss()}
+    finally:
+        shutil.rmtree(report_dir)
+    return stages
+
+
+def parse_line_legacy(line: bytes) -> Tuple[str, float] or None:
+    """
+    Исходная реализация парсинга строки (эталон для сравнения).
+    :param line: строка лога
+
+    :return: request - http-запрос
+             request_time - длительность обработки запроса
+             None - если не удалось распознать строку
+    """
+    line = line.decode("utf-8")
+    found = re.search(LEGACY_REF_PATTERN, line)
+    if found:
+        request = found.group(0).split()[1]
+        request_time = float(line.split()[-1])
+        return request, request_time
+    return None
+
+
+def read_chunk_legacy(path: str, start: int, end: int) -> Iterable[bytes]:
+    """
+    Исходная реализация чтения диапазона через буферизованный файл (эталон для сравнения).
+    :param path: путь до файла
+    :param start: смещение начала диапазона
+    :param end: смещение конца диапазона
+
+    :return: генератор строк
+    """
+    with open(path, "rb") as log_file:
+        log_file.seek(start)
+        pos = start
+        for line in log_file:
+            if pos >= end:
+                break
+            pos += len(line)
+            yield line
+
+
+def get_sample_lines(count: int) -> List[bytes]:
+    """
+    Формирование строк лога формата ui_short.
+    :param count: количество строк
+
+    :return: список строк лога
+    """
+    return [SAMPLE_LINE.format(banner=i % 1000, request_time=(i % 997) / 1000).encode() for i in range(count)]
+
+
+def bench_parse(parse_func: Callable, lines: List[bytes], repeat: int = 3) -> float:
+    """
+    Замер скорости парсинга строк.
+    :param parse_func: функция парсинга строки
+    :param lines: строки лога
+    :param repeat: количество повторов (берётся лучший результат)
+
+    :return: строк в секунду
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            parse_func(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(lines) / best
+
+
+def bench_gzip(path: str, decompressor: str or None, repeat: int = 3) -> float:
+    """
+    Замер скорости чтения строк *.gz лога.
+    :param path: путь до *.gz файла
+    :param decompressor: способ распаковки read_gzip, None - построчное чтение gzip.open
+    :param repeat: количество повторов (берётся лучший результат)
+
+    :return: строк в секунду
+    """
+    best, count = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if decompressor is None:
+            with gzip.open(path, "rb") as log_file:
+                count = sum(1 for _ in log_file)
+        else:
+            count = sum(1 for _ in log_analyzer.read_gzip(path, decompressor))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+def bench_read(read_func: Callable, path: str, parse_func: Callable = None, repeat: int = 3) -> float:
+    """
+    Замер скорости чтения (и, при заданном parse_func, парсинга) строк несжатого лога.
+    :param read_func: функция чтения диапазона байт файла
+    :param path: путь до файла
+    :param parse_func: функция парсинга строки (None - только чтение)
+    :param repeat: количество повторов (берётся лучший результат)
+
+    :return: строк в секунду
+    """
+    best, count, size = None, 0, os.path.getsize(path)
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if parse_func is None:
+            count = sum(1 for _ in read_func(path, 0, size))
+        else:
+            count = sum(1 for line in read_func(path, 0, size) if parse_func(line))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+def run_parse(args) -> None:
+    if args.log_path:
+        with open(args.log_path, "rb") as log_file:
+            lines = [line for _, line in zip(range(args.lines), log_file)]
+    else:
+        lines = get_sample_lines(args.lines)
+
+    legacy = bench_parse(parse_line_legacy, lines)
+    current = bench_parse(log_analyzer.parse_line, lines)
+    compiled = bench_parse(LogFormatParser(UI_SHORT_FORMAT), lines)
+    print(f"parse_line_legacy: {legacy:12.0f} lines/sec")
+    print(f"parse_line:        {current:12.0f} lines/sec (x{current / legacy:.2f})")
+    print(f"log_format:        {compiled:12.0f} lines/sec (x{compiled / legacy:.2f})")
+
+
+def run_gzip(args) -> None:
+    path = args.log_path
+    if not path:
+        fd, path = tempfile.mkstemp(suffix=".gz")
+        with os.fdopen(fd, "wb") as gz_file:
+            gz_file.write(gzip.compress(b"".join(get_sample_lines(args.lines))))
+    try:
+        baseline = bench_gzip(path, None)
+        print(f"gzip.open:         {baseline:12.0f} lines/sec")
+        for decompressor in ("zlib", "auto"):
+            current = bench_gzip(path, decompressor)
+            print(f"read_gzip({decompressor + '):':6} {current:12.0f} lines/sec (x{current / baseline:.2f})")
+    finally:
+        if not args.log_path:
+            os.remove(path)
+
+
+def run_read(args) -> None:
+    path = args.log_path
+    if not path:
+        fd, path = tempfile.mkstemp(suffix=".log")
+        with os.fdopen(fd, "wb") as log_file:
+            lines = get_sample_lines(min(args.lines, 1000000))
+            for _ in range(0, args.lines, len(lines)):
+                log_file.write(b"".join(lines))
+    try:
+        print(f"file size:         {os.path.getsize(path) / (1 << 20):12.0f} MB")
+        for parse_func in (None, log_analyzer.parse_line):
+            label = "read" if parse_func is None else "read+parse"
+            baseline = bench_read(read_chunk_legacy, path, parse_func)
+            current = bench_read(log_analyzer.read_chunk, path, parse_func)
+            print(f"{label + ' file:':18} {baseline:12.0f} lines/sec")
+            print(f"{label + ' mmap:':18} {current:12.0f} lines/sec (x{current / baseline:.2f})")
+    finally:
+        if not args.log_path:
+            os.remove(path)
+
+
+def run_generate(args) -> None:
+    path = args.output or "nginx-access-ui.log-20170629" + (".gz" if args.gz else "")
+    size = generate_log(path, args.lines, args.urls, args.error_rate, args.seed)
+    print(f"{path}: {args.lines} lines, {size / (1 << 20):.0f} MB uncompressed, {os.path.getsize(path)} bytes")
+
+
+def run_suite(args) -> None:
+    path = args.log_path
+    if not path:
+        path = os.path.join(tempfile.mkdtemp(), "nginx-access-ui.log-20170629" + (".gz" if args.gz else ""))
+        generate_log(path, args.lines, args.urls, args.error_rate, args.seed)
+    try:
+        stages = bench_stages(path, formats=tuple(args.formats.split(",")))
+        lines = stages["read"]["lines"]
+        total = sum(stage["time"] for stage in stages.values())
+        print(
+            f"log:       {lines} lines, {stages['read']['bytes'] / (1 << 20):.0f} MB, "
+            f"{stages['aggregate']['urls']} urls"
+        )
+        print(f"{'stage':10} {'sec':>8} {'lines/sec':>12} {'peak RSS MB':>12}")
+        for name in STAGES:
+            stage = stages[name]
+            speed = f"{lines / stage['time']:12.0f}" if name in ("read", "parse", "aggregate") else f"{'-':>12}"
+            print(f"{name:10} {stage['time']:8.3f} {speed} {stage['peak_rss'] / (1 << 20):12.0f}")
+        print(f"{'total':10} {total:8.3f} {lines / total:12.0f}")
+    finally:
+        if not args.log_path:
+            shutil.rmtree(os.path.dirname(path))
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-m",
+        "--mode",
+        choices=("parse", "gzip", "read", "suite", "generate"),
+        default="parse",
+        help="Benchmark: parse / gzip / read / suite (time per stage), generate - write a synthetic log",
+    )
+    parser.add_argument("-u", "--urls", type=int, default=10000, help="Distinct urls in generated log: 10000")
+    parser.add_argument("-e", "--error_rate", type=float, default=0.0, help="Share of malformed lines: 0.01")
+    parser.add_argument("-z", "--gz", action="store_true", help="Generate gzipped log")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Generator seed")
+    parser.add_argument("-o", "--output", type=str, help="Generated log path")
+    parser.add_argument("-f", "--formats", type=str, default="html", help="Report formats for suite: html,jsonl")
+    parser.add_argument("-n", "--lines", type=int, default=200000, help="Lines to generate: 200000")
+    parser.add_argument("-log", "--log_path", type=str, help="Read lines from log file instead of generating")
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = get_args()
+    if args.mode == "gzip":
+        run_gzip(args)
+    elif args.mode == "read":
+        run_read(args)
+    elif args.mode == "suite":
+        run_suite(args)
+    elif args.mode == "generate":
+        run_generate(args)
+    else:
+        run_parse(args)
+
+
+if __name__ == "__main__":
+    main()
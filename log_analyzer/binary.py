@@ -0,0 +1,30 @@
+import sys
+from array import array
+
+
+def to_le(values: array) -> bytes:
+    """
+    Байты массива в порядке little-endian (независимо от порядка байт платформы).
+    :param values: массив значений
+
+    :return: байты массива
+    """
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_le(typecode: str, data: bytes) -> array:
+    """
+    Массив из байтов в порядке little-endian.
+    :param typecode: код типа элементов массива
+    :param data: байты массива
+
+    :return: массив значений
+    """
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
@@ -0,0 +1,81 @@
+import logging
+import os
+import pickle
+import time
+from typing import Callable, Dict
+
+CATALOG_VERSION = 1
+# изменения директории в пределах этого интервала до сканирования могут не отразиться
+# в её mtime (грубая дискретность времени ФС), поэтому такой кэш перепроверяется
+RACY_INTERVAL_NS = 2 * 10**9
+
+
+class LogCatalog:
+    """
+    Сохраняемый индекс директорий логов и отчётов.
+    Для каждой директории хранятся её mtime и сведения о файлах, вычисленные
+    функцией match. Пока mtime директории не меняется, список файлов берётся
+    из индекса без чтения директории; при изменении директория читается через
+    os.scandir, а match вызывается только для новых или заменённых (по inode) файлов.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.dirs: Dict[tuple, dict] = {}
+        self.changed = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, "rb") as catalog_file:
+                    catalog = pickle.load(catalog_file)
+                if catalog.get("version") == CATALOG_VERSION:
+                    self.dirs = catalog["dirs"]
+            except Exception as e:
+                logging.error("Невозможно прочитать индекс логов %s: %s", path, e)
+
+    def scan(self, directory: str, kind: str, match: Callable[[os.DirEntry], object]) -> Dict[str, object]:
+        """
+        Получение сведений о файлах директории.
+        :param directory: директория
+        :param kind: вид сведений (у одной директории может быть несколько индексов)
+        :param match: функция сведений о файле, None - файл не нужен
+
+        :return: словарь вида имя файла: сведения (только файлы со сведениями)
+        """
+        key = (os.path.abspath(directory), kind)
+        mtime_ns = os.stat(directory).st_mtime_ns
+        cached = self.dirs.get(key)
+        if cached and cached["mtime_ns"] == mtime_ns and cached["scanned_ns"] - mtime_ns > RACY_INTERVAL_NS:
+            return cached["found"]
+
+        scanned_ns = time.time_ns()
+        inodes, found = (cached["inodes"], cached["found"]) if cached else ({}, {})
+        new_inodes, new_found, matched = {}, {}, 0
+        with os.scandir(directory) as dir_entries:
+            for entry in dir_entries:
+                name, inode = entry.name, entry.inode()
+                if inodes.get(name) == inode:
+                    info = found.get(name)
+                else:
+                    info = match(entry)
+                    matched += 1
+                new_inodes[name] = inode
+                if info is not None:
+                    new_found[name] = info
+
+        logging.debug("Индекс %s (%s): файлов %i, новых %i", directory, kind, len(new_inodes), matched)
+        self.dirs[key] = {"mtime_ns": mtime_ns, "scanned_ns": scanned_ns, "inodes": new_inodes, "found": new_found}
+        self.changed = True
+        return new_found
+
+    def save(self) -> None:
+        """
+        Атомарная запись индекса, если он изменился.
+
+        :return: None
+        """
+        if not self.path or not self.changed:
+            return
+        with open(self.path + ".tmp", "wb") as catalog_file:
+            pickle.dump({"version": CATALOG_VERSION, "dirs": self.dirs}, catalog_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(self.path + ".tmp", self.path)
+        self.changed = False
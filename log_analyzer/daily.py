@@ -0,0 +1,127 @@
+import json
+import struct
+from array import array
+from typing import Dict, Tuple
+
+from aggregate import MEDIAN_APPROX, TIME_SCALE, QuantileSketch, UrlStat
+from binary import from_le, to_le
+
+DAILY_MAGIC = b"LADAY1\n"
+
+
+def write_daily(path: str, requests: Dict[str, UrlStat], full_time: float, full_cnt: int, error_cnt: int) -> None:
+    """
+    Запись агрегатов за день в компактном бинарном формате.
+    Файл: DAILY_MAGIC, длина заголовка (uint32 LE), JSON-заголовок с итогами
+    и точностью скетча, затем колонки по url: смещения uint32 и байты utf-8 url,
+    count - int64, time_sum и time_max - float64, нули скетча - int64,
+    смещения корзин uint32 (rows + 1), ключи корзин int32 и счётчики корзин uint32.
+    Значения request_time хранятся только в виде скетча, поэтому размер файла
+    не зависит от числа запросов.
+    :param path: путь до файла агрегатов
+    :param requests: словарь вида url: агрегат request_time
+    :param full_time: общая длительность выполнения запросов
+    :param full_cnt: общее количество выполненных запросов
+    :param error_cnt: количество нераспознанных строк
+
+    :return: None
+    """
+    urls = [url.encode("utf-8") for url in requests]
+    url_offsets, bucket_offsets = array("I", [0]), array("I", [0])
+    counts, time_sums, time_maxes, zero_cnts = array("q"), array("d"), array("d"), array("q")
+    keys, key_counts = array("i"), array("I")
+    relative_accuracy = QuantileSketch().relative_accuracy
+    for url, stat in zip(urls, requests.values()):
+        sketch = get_sketch(stat)
+        if sketch.relative_accuracy != relative_accuracy:
+            raise ValueError("Невозможно сохранить скетчи с разной точностью")
+        url_offsets.append(url_offsets[-1] + len(url))
+        counts.append(stat.count)
+        time_sums.append(stat.time_sum)
+        time_maxes.append(stat.time_max)
+        zero_cnts.append(sketch.zero_cnt)
+        for key in sorted(sketch.buckets):
+            keys.append(key)
+            key_counts.append(sketch.buckets[key])
+        bucket_offsets.append(len(keys))
+
+    header = json.dumps(
+        {
+            "rows": len(urls),
+            "buckets": len(keys),
+            "full_time": full_time,
+            "full_cnt": full_cnt,
+            "error_cnt": error_cnt,
+            "relative_accuracy": relative_accuracy,
+        }
+    ).encode()
+    with open(path, "wb") as daily_file:
+        daily_file.write(DAILY_MAGIC)
+        daily_file.write(struct.pack("<I", len(header)))
+        daily_file.write(header)
+        daily_file.write(to_le(url_offsets))
+        daily_file.write(b"".join(urls))
+        for column in (counts, time_sums, time_maxes, zero_cnts, bucket_offsets, keys, key_counts):
+            daily_file.write(to_le(column))
+
+
+def read_daily(path: str, requests: Dict[str, UrlStat] = None) -> Tuple[Dict[str, UrlStat], float, int, int]:
+    """
+    Чтение агрегатов за день.
+    Агрегаты восстанавливаются в приближённом режиме со скетчем.
+    Если передан словарь requests, агрегаты дня добавляются к нему на месте
+    без создания промежуточных объектов (для сводных отчётов за много дней).
+    :param path: путь до файла агрегатов
+    :param requests: накопленные агрегаты, прочитанные из файлов агрегатов
+
+    :return: requests - словарь вида url: агрегат request_time
+             full_time - общая длительность выполнения запросов за день
+             full_cnt - общее количество выполненных запросов за день
+             error_cnt - количество нераспознанных строк за день
+    """
+    with open(path, "rb") as daily_file:
+        if daily_file.read(len(DAILY_MAGIC)) != DAILY_MAGIC:
+            raise ValueError(f"Файл не является файлом агрегатов: {path}")
+        (header_size,) = struct.unpack("<I", daily_file.read(4))
+        header = json.loads(daily_file.read(header_size))
+        rows, buckets = header["rows"], header["buckets"]
+
+        url_offsets = from_le("I", daily_file.read(4 * (rows + 1)))
+        urls = daily_file.read(url_offsets[-1])
+        counts = from_le("q", daily_file.read(8 * rows))
+        time_sums = from_le("d", daily_file.read(8 * rows))
+        time_maxes = from_le("d", daily_file.read(8 * rows))
+        zero_cnts = from_le("q", daily_file.read(8 * rows))
+        bucket_offsets = from_le("I", daily_file.read(4 * (rows + 1)))
+        keys = from_le("i", daily_file.read(4 * buckets))
+        key_counts = from_le("I", daily_file.read(4 * buckets))
+
+    requests = {} if requests is None else requests
+    for i in range(rows):
+        url = urls[url_offsets[i] : url_offsets[i + 1]].decode("utf-8")
+        start, end = bucket_offsets[i], bucket_offsets[i + 1]
+        stat = requests.get(url)
+        if stat is None:
+            stat = requests[url] = UrlStat(MEDIAN_APPROX)
+            stat.times, stat.sketch = None, QuantileSketch(header["relative_accuracy"])
+        if not stat.count or time_maxes[i] > stat.time_max:
+            stat.time_max = time_maxes[i]
+        stat.count += counts[i]
+        stat.time_ms += round(time_sums[i] * TIME_SCALE)
+        stat.sketch.add_buckets(zip(keys[start:end], key_counts[start:end]), zero_cnts[i])
+    return requests, header["full_time"], header["full_cnt"], header["error_cnt"]
+
+
+def get_sketch(stat: UrlStat) -> QuantileSketch:
+    """
+    Скетч request_time агрегата (без изменения самого агрегата).
+    :param stat: агрегат request_time
+
+    :return: скетч агрегата или скетч, построенный по накопленным значениям
+    """
+    if stat.sketch is not None:
+        return stat.sketch
+    sketch = QuantileSketch()
+    for request_time in stat.times:
+        sketch.add(request_time)
+    return sketch
@@ -8,16 +8,37 @@
 #                     '$request_time';
 import argparse
 import configparser
-import gzip
-import json
+import cProfile
+import glob
+import heapq
 import logging
+import math
+import mmap
 import os
+import pickle
+import queue
+import random
 import re
-import statistics
+import shutil
+import subprocess
 import sys
+import threading
+import time
+import zlib
+from array import array
 from collections import namedtuple
 from datetime import datetime
-from typing import Callable, Dict, List, Tuple
+from functools import partial
+from multiprocessing import Pool
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from aggregate import MEDIAN_EXACT, MEDIAN_MODES, UrlStat, get_full_time
+from catalog import LogCatalog
+from daily import read_daily, write_daily
+from log_format import LogFormatParser
+from metrics import Metrics
+from normalizer import UrlNormalizer
+from writers import REPORT_FORMATS, REPORT_WRITERS, write_html
 
 default_config = {
     "REPORT_SIZE": 1000,
@@ -25,18 +46,87 @@ default_config = {
     "LOG_DIR": "./log/",
     "ERROR_PERC_LIMIT": 50,
     "LOG_FILE_PATH": None,
+    "JOBS": 1,
+    "MEDIAN_MODE": MEDIAN_EXACT,
+    "INCREMENTAL": False,
+    "BACKFILL": False,
+    "GZIP_DECOMPRESSOR": "zlib",
+    "URL_STRIP_QUERY": False,
+    "URL_COLLAPSE_IDS": False,
+    "URL_MAX_KEYS": 0,
+    "REPORT_FORMATS": ("html",),
+    "WINDOW": None,
+    "PERCENTILES": (90, 95, 99),
+    "FOLLOW": False,
+    "FOLLOW_INTERVAL": 60,
+    "DAILY_AGGREGATES": True,
+    "ROLLUP": None,
+    "ERROR_MIN_LINES": 1000,
+    "ERROR_SAMPLE": 0,
+    "METRICS": True,
+    "PROFILE": False,
+    "LOG_SOURCES": (),
+    "LOG_FORMAT": None,
+    "LOG_CATALOG": None,
 }
 
 Log = namedtuple("Log", "date name path is_gz")
+ParseResult = namedtuple("ParseResult", "requests full_time full_cnt error_cnt windows")
+ErrorLimit = namedtuple("ErrorLimit", "perc min_lines")
 
 COMMON_PATTERN = r"^nginx-access-ui\.log-(?P<date>\d{8})(\.gz)?$"
-REF_PATTERN = r"(GET|POST).*(HTTP)"
+REF_PATTERN = re.compile(rb"(?:GET|POST)\s+(\S+)\s+HTTP")
+CHECKPOINT_VERSION = 5
+GZIP_BLOCK_SIZE = 1 << 20
+GZIP_QUEUE_SIZE = 8
+GZIP_COMMANDS = ("pigz", "gzip")
+# длина префикса $time_local (dd/Mon/yyyy:HH:MM), определяющего временное окно
+WINDOWS = {"minute": 17, "hour": 14}
+DAILY_PATTERN = r"^report-(?P<date>\d{4}\.\d{2}\.\d{2})\.agg$"
+ROLLUP_PERIODS = {"week": "%G-W%V", "month": "%Y.%m"}
+ERROR_CONFIDENCE_Z = 2.576
+ERROR_SAMPLE_POINTS = 16
+FOLLOW_LOG_NAME = "nginx-access-ui.log"
+FOLLOW_READ_SIZE = 1 << 20
+FOLLOW_POLL_INTERVAL = 1.0
+MONTHS = {
+    month.encode(): f"{number:02}"
+    for number, month in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1
+    )
+}
+
+
+class ErrorLimitExceeded(ValueError):
+    """Доля ошибок распознавания на достаточной выборке строк превысила ERROR_PERC_LIMIT."""
+
+    def __init__(self, error_cnt: int, line_cnt: int):
+        super().__init__(error_cnt, line_cnt)
+        self.error_cnt = error_cnt
+        self.line_cnt = line_cnt
 
+    def __str__(self) -> str:
+        return f"ошибок распознавания {self.error_cnt} из {self.line_cnt} строк"
 
-def get_report(log: Log) -> Tuple[List[dict], float]:
+
+def get_report(
+    log: Log,
+    jobs: int = 1,
+    median_mode: str = MEDIAN_EXACT,
+    decompressor: str = "zlib",
+    report_size: int = None,
+    normalizer: UrlNormalizer = None,
+    metrics: Metrics = None,
+) -> Tuple[List[dict], float]:
     """
     Получение отчёта по ранее найденному логу.
     :param log: данные по логу
+    :param jobs: количество процессов для парсинга лога
+    :param median_mode: режим расчёта медианы: exact или approx
+    :param decompressor: способ распаковки *.gz логов: zlib, auto или имя утилиты
+    :param report_size: число url с наибольшим суммарным временем в отчёте (None - все)
+    :param normalizer: нормализатор url (None - url без изменений)
+    :param metrics: метрики запуска: время этапов parse и stat
 
     :return: Отчёт, сортированный по убыванию
             времени обработки запроса
@@ -44,112 +134,994 @@ def get_report(log: Log) -> Tuple[List[dict], float]:
     """
     if not log.name:
         return [], 0
-    requests, full_request_time, full_request_cnt, error_cnt = parse_log(log, parse_line)
-    error_perc = 100 * error_cnt / full_request_cnt if full_request_cnt else 0
+    metrics = metrics or Metrics()
+    with metrics.stage("parse"):
+        result = parse_log(log, parse_line, jobs, median_mode, decompressor, normalizer, metrics=metrics)
+    set_result_metrics(metrics, log, result)
+    with metrics.stage("stat"):
+        report = calc_stat(result.requests, result.full_time, result.full_cnt, report_size)
+    return report, get_error_perc(result)
+
+
+def get_incremental_report(
+    log: Log,
+    report_dir: str,
+    jobs: int = 1,
+    median_mode: str = MEDIAN_EXACT,
+    report_size: int = None,
+    normalizer: UrlNormalizer = None,
+) -> Tuple[List[dict], float] or None:
+    """
+    Получение отчёта по несжатому логу с продолжением от контрольной точки.
+    Разбираются только полные строки, дописанные после предыдущего запуска,
+    результат объединяется с сохранённым состоянием.
+    :param log: данные по логу
+    :param report_dir: директория хранения отчётов и контрольных точек
+    :param jobs: количество процессов для парсинга лога
+    :param median_mode: режим расчёта медианы: exact или approx
+    :param report_size: число url с наибольшим суммарным временем в отчёте (None - все)
+    :param normalizer: нормализатор url (None - url без изменений)
+
+    :return: Отчёт и процент ошибок распознавания,
+             None - если новых строк нет и отчёт уже существует
+    """
+    result = update_checkpoint(log, report_dir, parse_line, jobs, median_mode, normalizer)
+    if result is None:
+        return None
+
+    return calc_stat(result.requests, result.full_time, result.full_cnt, report_size), get_error_perc(result)
+
+
+def update_checkpoint(
+    log: Log,
+    report_dir: str,
+    parse_func: Callable,
+    jobs: int = 1,
+    median_mode: str = MEDIAN_EXACT,
+    normalizer: UrlNormalizer = None,
+    error_limit: ErrorLimit = None,
+) -> ParseResult or None:
+    """
+    Разбор строк несжатого лога, дописанных после контрольной точки,
+    и сохранение объединённого состояния.
+    :param log: данные по логу
+    :param report_dir: директория хранения отчётов и контрольных точек
+    :param parse_func: функция парсинга строки
+    :param jobs: количество процессов для парсинга лога
+    :param median_mode: режим расчёта медианы: exact или approx
+    :param normalizer: нормализатор url (None - url без изменений)
+    :param error_limit: порог ошибок для досрочной остановки (None - без проверки)
+
+    :return: накопленный результат разбора лога,
+             None - если новых строк нет и отчёт уже существует
+    """
+    path = os.path.join(log.path, log.name)
+    window = getattr(parse_func, "window", None)
+    log_format = getattr(getattr(parse_func, "parse_func", parse_func), "log_format", None)
+    checkpoint = load_checkpoint(log, report_dir, median_mode, normalizer, window, log_format)
+    offset, result = (checkpoint["offset"], checkpoint["result"]) if checkpoint else (0, None)
+    end = get_complete_end(path, offset)
+
+    if checkpoint and end == offset and is_already_analyzed(log, report_dir):
+        return None
+    if end > offset or not checkpoint:
+        logging.info("Разбор лога %s с позиции %i по %i", log.name, offset, end)
+        part = parse_range(path, offset, end, parse_func, jobs, median_mode, normalizer, error_limit)
+        result = merge_results([result, part], normalizer) if result else part
+        save_checkpoint(log, report_dir, end, result, median_mode, normalizer, window, log_format)
+    return result
+
+
+def get_error_perc(result: ParseResult) -> float:
+    """
+    Вычисление процента ошибок распознавания.
+    :param result: результат разбора лога
+
+    :return: процент ошибок относительно распознанных строк
+    """
+    return 100 * result.error_cnt / result.full_cnt if result.full_cnt else 0
+
+
+def check_error_limit(error_limit: ErrorLimit, error_cnt: int, line_cnt: int) -> None:
+    """
+    Проверка текущей доли ошибок распознавания.
+    Порог ERROR_PERC_LIMIT задан относительно распознанных строк, поэтому он
+    переводится в долю ошибок среди всех строк. Превышение считается значимым,
+    если разобрано не меньше min_lines строк и нижняя граница доверительного
+    интервала доли ошибок (нормальное приближение, z = ERROR_CONFIDENCE_Z) выше порога.
+    :param error_limit: порог ошибок
+    :param error_cnt: количество ошибок распознавания
+    :param line_cnt: количество разобранных строк
+
+    :return: None
+    """
+    if line_cnt < error_limit.min_lines:
+        return
+    limit = error_limit.perc / (100 + error_limit.perc)
+    share = error_cnt / line_cnt
+    if share - ERROR_CONFIDENCE_Z * math.sqrt(share * (1 - share) / line_cnt) > limit:
+        raise ErrorLimitExceeded(error_cnt, line_cnt)
+
+
+def sample_error_perc(
+    log: Log, parse_func: Callable, lines: int, decompressor: str = "zlib", seed: int = None
+) -> float or None:
+    """
+    Предварительная оценка процента ошибок по выборке строк лога.
+    Несжатый лог читается с ERROR_SAMPLE_POINTS случайных смещений (неполная
+    строка после смещения пропускается), сжатый - с начала, так как
+    произвольный доступ к gzip невозможен.
+    :param log: информация о логе
+    :param parse_func: функция парсинга строки
+    :param lines: размер выборки в строках
+    :param decompressor: способ распаковки *.gz логов
+    :param seed: начальное значение генератора случайных смещений
 
-    return calc_stat(requests, full_request_time, full_request_cnt), error_perc
+    :return: процент ошибок относительно распознанных строк или None, если строк нет
+    """
+    path = os.path.join(log.path, log.name)
+    if log.is_gz:
+        sample = [line for _, line in zip(range(lines), read_gzip(path, decompressor))]
+    else:
+        size, sample = os.path.getsize(path), []
+        points = min(ERROR_SAMPLE_POINTS, lines)
+        offsets = sorted(random.Random(seed).randrange(size) for _ in range(points)) if size else []
+        with open(path, "rb") as log_file:
+            for offset in offsets:
+                log_file.seek(offset)
+                if offset:
+                    log_file.readline()
+                sample.extend(line for _, line in zip(range(lines // points), log_file))
+    if not sample:
+        return None
+    ok_cnt = sum(1 for line in sample if parse_func(line))
+    return 100 * (len(sample) - ok_cnt) / ok_cnt if ok_cnt else math.inf
 
 
-def get_last_log(log_dir: str) -> namedtuple or None:
+def get_last_log(log_dir: str, catalog: LogCatalog = None) -> namedtuple or None:
     """
     Получение наименования файла последней записи логов интерфейса.
     :param log_dir: директория чтения логов
+    :param catalog: индекс логов (None - чтение директории целиком)
 
     :return: Tuple вида:
              date - дата записи лога
              name - наименование файла
              is_gz - является *gz расширением
     """
-    last_log = None
-    for name in os.listdir(log_dir):
-        found = re.match(COMMON_PATTERN, name)
-        if found:
-            name = found.group(0)
-            date = found.group(1)
-            is_gz = found.group(2)
+    if catalog is None:
+        logs = get_logs(log_dir)
+        return logs[-1] if logs else None
 
-            try:
-                date = datetime.strptime(date, "%Y%m%d")
-            except ValueError:
-                logging.error("Невозможно извлечь дату: %s", date)
-                continue
+    found = catalog.scan(log_dir, "logs", get_log_entry)
+    if not found:
+        return None
+    date = max(info[0] for info in found.values())
+    name = min(name for name, info in found.items() if info[0] == date)
+    return Log(date, name, log_dir, found[name][1])
+
+
+def get_logs(log_dir: str, catalog: LogCatalog = None) -> List[Log]:
+    """
+    Получение всех логов интерфейса в директории.
+    С индексом имена разбираются только у новых файлов директории.
+    :param log_dir: директория чтения логов
+    :param catalog: индекс логов (None - чтение директории целиком)
+
+    :return: список логов по возрастанию даты (по одному логу на дату)
+    """
+    if catalog is None:
+        found = ((name, match_log(name)) for name in os.listdir(log_dir))
+    else:
+        found = sorted(catalog.scan(log_dir, "logs", get_log_entry).items())
+
+    logs = {}
+    for name, info in found:
+        if info and info[0] not in logs:
+            logs[info[0]] = Log(info[0], name, log_dir, info[1])
 
-            if not last_log or date > last_log.date:
-                last_log = Log(date, name, log_dir, is_gz and True)
+    return [logs[date] for date in sorted(logs)]
 
-    return last_log
 
+def match_log(name: str) -> Tuple[datetime, bool] or None:
+    """
+    Разбор имени файла лога интерфейса.
+    :param name: имя файла
+
+    :return: дата лога и признак *.gz или None, если файл не является логом
+    """
+    found = re.match(COMMON_PATTERN, name)
+    if not found:
+        return None
+    try:
+        date = datetime.strptime(found.group(1), "%Y%m%d")
+    except ValueError:
+        logging.error("Невозможно извлечь дату: %s", found.group(1))
+        return None
+    return date, bool(found.group(2))
+
+
+def get_log_entry(entry: os.DirEntry) -> Tuple[datetime, bool, int, int] or None:
+    """
+    Сведения о файле лога для индекса логов.
+    :param entry: файл директории логов
+
+    :return: дата лога, признак *.gz, размер и mtime (нс) на момент обнаружения
+             или None, если файл не является логом
+    """
+    info = match_log(entry.name)
+    if info is None:
+        return None
+    stat = entry.stat()
+    return info[0], info[1], stat.st_size, stat.st_mtime_ns
 
-def parse_log(log: Log, parse_func: Callable) -> Tuple[Dict[str, List[float]], int, int, int]:
+
+def parse_log(
+    log: Log,
+    parse_func: Callable,
+    jobs: int = 1,
+    median_mode: str = MEDIAN_EXACT,
+    decompressor: str = "zlib",
+    normalizer: UrlNormalizer = None,
+    error_limit: ErrorLimit = None,
+    metrics: Metrics = None,
+) -> ParseResult:
     """
     Сбор информации по логу.
+    Несжатый лог при jobs > 1 разбивается на диапазоны байт,
+    которые разбираются параллельно в пуле процессов.
     :param log: информация о рассматриваемом логе
     :param parse_func: функция парсинга строки
+    :param jobs: количество процессов для парсинга
+    :param median_mode: режим расчёта медианы: exact или approx
+    :param decompressor: способ распаковки *.gz логов: zlib, auto или имя утилиты
+    :param normalizer: нормализатор url (None - url без изменений)
+    :param error_limit: порог ошибок для досрочной остановки (None - без проверки)
+    :param metrics: метрики запуска: время ожидания распаковки *.gz (gzip_wait)
 
-    :return: requests - словарь вида url-запрос: список request_time
+    :return: ParseResult:
+             requests - словарь вида url-запрос: агрегат request_time
              full_time - общая длительность выполнения запросов
              full_cnt - общее количество выполненных запросов
              error_cnt - общее количество ошибок распознавания
+             windows - словарь вида временное окно: агрегат request_time
+    """
+    path = os.path.join(log.path, log.name)
+    if not log.is_gz:
+        return parse_range(path, 0, os.path.getsize(path), parse_func, jobs, median_mode, normalizer, error_limit)
+    if jobs > 1:
+        logging.info("Параллельный парсинг сжатых логов не поддерживается, используется 1 процесс")
+
+    lines = read_gzip(path, decompressor, metrics=metrics)
+    return parse_lines(lines, parse_func, median_mode, normalizer, error_limit=error_limit)
+
+
+def parse_range(
+    path: str,
+    start: int,
+    end: int,
+    parse_func: Callable,
+    jobs: int = 1,
+    median_mode: str = MEDIAN_EXACT,
+    normalizer: UrlNormalizer = None,
+    error_limit: ErrorLimit = None,
+) -> ParseResult:
+    """
+    Сбор информации по диапазону байт несжатого лога.
+    Порог ошибок при jobs > 1 проверяется так же, как при последовательном разборе:
+    первый диапазон проверяется по ходу разбора (его строки - начало лога),
+    остальные возвращают номера строк с ошибками, и проверки повторяются
+    после разбора по общим счётчикам в исходном порядке строк.
+    :param path: путь до файла
+    :param start: смещение начала диапазона
+    :param end: смещение конца диапазона
+    :param parse_func: функция парсинга строки
+    :param jobs: количество процессов для парсинга
+    :param median_mode: режим расчёта медианы: exact или approx
+    :param normalizer: нормализатор url (None - url без изменений)
+    :param error_limit: порог ошибок для досрочной остановки (None - без проверки)
+
+    :return: кортеж аналогичный результату parse_log
+    """
+    if jobs <= 1:
+        return parse_chunk(path, start, end, parse_func, median_mode, normalizer, error_limit)
+
+    chunks = [
+        (path, *chunk, parse_func, median_mode, normalizer, error_limit if i == 0 else None, error_limit is not None)
+        for i, chunk in enumerate(get_chunks(path, jobs, start, end))
+    ]
+    with Pool(len(chunks) or 1) as pool:
+        parts = pool.starmap(parse_chunk_errors, chunks)
+    if error_limit:
+        check_chunk_errors(error_limit, parts)
+    return merge_results((result for result, _ in parts), normalizer)
+
+
+def check_chunk_errors(error_limit: ErrorLimit, parts: Iterable[Tuple[ParseResult, array]]) -> None:
+    """
+    Проверка порога ошибок по результатам диапазонов в исходном порядке.
+    Проверка выполняется в тех же точках, что и при последовательном разборе, -
+    после каждой строки с ошибкой, по счётчикам с начала всего диапазона.
+    :param error_limit: порог ошибок
+    :param parts: результаты диапазонов и номера строк с ошибками внутри диапазона
+
+    :return: None
+    """
+    error_cnt, line_cnt = 0, 0
+    for result, error_lines in parts:
+        for i, line_no in enumerate(error_lines, 1):
+            check_error_limit(error_limit, error_cnt + i, line_cnt + line_no)
+        error_cnt += result.error_cnt
+        line_cnt += result.full_cnt + result.error_cnt
+
+
+def parse_lines(
+    lines: Iterable[bytes],
+    parse_func: Callable,
+    median_mode: str = MEDIAN_EXACT,
+    normalizer: UrlNormalizer = None,
+    result: ParseResult = None,
+    error_limit: ErrorLimit = None,
+    error_lines: array = None,
+) -> ParseResult:
+    """
+    Сбор информации по строкам лога.
+    Если parse_func возвращает третьим элементом временное окно,
+    request_time дополнительно агрегируется по окнам.
+    :param lines: строки лога
+    :param parse_func: функция парсинга строки
+    :param median_mode: режим расчёта медианы: exact или approx
+    :param normalizer: нормализатор url (None - url без изменений)
+    :param result: накопленный результат, агрегаты которого дополняются на месте
+    :param error_limit: порог ошибок: при его превышении на достаточной выборке
+                        разбор прерывается исключением ErrorLimitExceeded
+    :param error_lines: массив, в который добавляются номера строк с ошибками (с единицы)
+
+    :return: кортеж аналогичный результату parse_log
+    """
+    if result is None:
+        requests, windows = {}, {}
+        full_request_cnt, error_cnt = 0, 0
+    else:
+        requests, _, full_request_cnt, error_cnt, windows = result
+    for line in lines:
+        line_info = parse_func(line)
+        if line_info:
+            request, request_time = line_info[0], line_info[1]
+            if len(line_info) > 2:
+                window_stat = windows.get(line_info[2])
+                if window_stat is None:
+                    window_stat = windows[line_info[2]] = UrlStat(median_mode)
+                window_stat.add(request_time)
+            if normalizer:
+                request = normalizer.get_key(normalizer(request), requests)
+            stat = requests.get(request)
+            if stat is None:
+                stat = requests[request] = UrlStat(median_mode)
+            stat.add(request_time)
+            full_request_cnt += 1
+        else:
+            error_cnt += 1
+            if error_lines is not None:
+                error_lines.append(full_request_cnt + error_cnt)
+            if error_limit:
+                check_error_limit(error_limit, error_cnt, full_request_cnt + error_cnt)
+    return ParseResult(requests, get_full_time(requests), full_request_cnt, error_cnt, windows)
+
+
+def get_chunks(path: str, jobs: int, start: int = 0, end: int = None) -> List[Tuple[int, int]]:
+    """
+    Разбиение файла (или его диапазона байт) на диапазоны,
+    границы которых выровнены по концу строки.
+    :param path: путь до файла
+    :param jobs: желаемое количество диапазонов
+    :param start: смещение начала разбиваемой области
+    :param end: смещение конца разбиваемой области (по умолчанию - размер файла)
+
+    :return: список непустых диапазонов вида (начало, конец)
+    """
+    end = os.path.getsize(path) if end is None else end
+    bounds = [start]
+    with open(path, "rb") as log_file:
+        for i in range(1, jobs):
+            pos = max(start + (end - start) * i // jobs, bounds[-1])
+            if pos >= end:
+                break
+            log_file.seek(pos)
+            log_file.readline()
+            bounds.append(min(log_file.tell(), end))
+    bounds.append(end)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def read_chunk(path: str, start: int, end: int) -> Iterable[bytes]:
+    """
+    Чтение строк файла в диапазоне байт [start, end).
+    Файл отображается в память (mmap): поиск конца строки и копирование
+    строки выполняются в одном вызове readline без буфера файла
+    и без подсчёта позиции в Python.
+    :param path: путь до файла
+    :param start: смещение начала диапазона
+    :param end: смещение конца диапазона
+
+    :return: генератор строк
+    """
+    if start >= end:
+        return
+    with open(path, "rb") as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+        log_map.seek(start)
+        readline, tell = log_map.readline, log_map.tell
+        while tell() < end:
+            yield readline()
+
+
+def read_gzip(
+    path: str, decompressor: str = "zlib", block_size: int = GZIP_BLOCK_SIZE, metrics: Metrics = None
+) -> Iterable[bytes]:
+    """
+    Чтение строк *.gz лога крупными блоками.
+    Распаковка и разбиение на строки выполняются в отдельном потоке
+    (zlib и чтение из канала освобождают GIL), строки передаются
+    пачками через ограниченную очередь.
+    :param path: путь до файла
+    :param decompressor: zlib - распаковка в процессе,
+                         auto - pigz/gzip при наличии, иначе zlib,
+                         иное значение - имя утилиты распаковки
+    :param block_size: размер блока чтения
+    :param metrics: метрики запуска: суммарное время ожидания потребителем
+                    очередной пачки строк (gzip_wait) - доля распаковки, не перекрытая парсингом
+
+    :return: генератор строк (без символа перевода строки)
+    """
+    batches = queue.Queue(GZIP_QUEUE_SIZE)
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=produce_gzip_lines, args=(path, decompressor, block_size, batches, stop), daemon=True
+    )
+    producer.start()
+    try:
+        while True:
+            if metrics is None:
+                batch = batches.get()
+            else:
+                start = time.perf_counter()
+                batch = batches.get()
+                metrics.add("gzip_wait", time.perf_counter() - start)
+            if batch is None:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            yield from batch
+    finally:
+        stop.set()
+
+
+def produce_gzip_lines(path: str, decompressor: str, block_size: int, batches: queue.Queue, stop: threading.Event):
+    """
+    Поток-производитель для read_gzip: распаковывает лог и кладёт в очередь
+    списки строк, по завершении - None, при ошибке - исключение.
+    :param path: путь до файла
+    :param decompressor: способ распаковки
+    :param block_size: размер блока чтения
+    :param batches: очередь пачек строк
+    :param stop: событие остановки потребителем
+
+    :return: None
+    """
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        tail = b""
+        for block in iter_gzip_blocks(path, decompressor, block_size):
+            lines = (tail + block).split(b"\n")
+            tail = lines.pop()
+            if not put(lines):
+                return
+        put([tail] if tail else [])
+        put(None)
+    except Exception as e:
+        put(e)
+
+
+def iter_gzip_blocks(path: str, decompressor: str, block_size: int) -> Iterable[bytes]:
+    """
+    Получение распакованных блоков *.gz файла.
+    :param path: путь до файла
+    :param decompressor: способ распаковки
+    :param block_size: размер блока чтения
+
+    :return: генератор распакованных блоков
+    """
+    command = get_gzip_command(decompressor)
+    if command:
+        with subprocess.Popen([command, "-dc", path], stdout=subprocess.PIPE, bufsize=block_size) as proc:
+            for block in iter(lambda: proc.stdout.read(block_size), b""):
+                yield block
+        if proc.returncode:
+            raise OSError(f"{command} завершился с кодом {proc.returncode}")
+        return
+
+    with open(path, "rb") as gz_file:
+        decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        in_member = False
+        for block in iter(lambda: gz_file.read(block_size), b""):
+            while block:
+                in_member = True
+                yield decomp.decompress(block)
+                if not decomp.eof:
+                    break
+                # начало следующего gzip-члена (многочленный файл)
+                block = decomp.unused_data
+                decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                in_member = False
+        yield decomp.flush()
+    if in_member:
+        # обрезанный файл (как в gzip.open): неполный лог не должен давать отчёт
+        raise EOFError(f"Файл {path} обрезан: нет конца сжатого потока")
+
+
+def get_gzip_command(decompressor: str) -> str or None:
+    """
+    Выбор внешней утилиты распаковки.
+    :param decompressor: zlib, auto или имя утилиты
+
+    :return: путь до утилиты или None для распаковки через zlib
     """
-    requests = {}
-    full_request_time, full_request_cnt, error_cnt = 0, 0, 0
-    read_params = os.path.join(log.path, log.name), "rb"
-    open_func = gzip.open(*read_params) if log.is_gz else open(*read_params)
-    with open_func as log_file:
-        for line in log_file:
-            line_info = parse_func(line)
-            if line_info:
-                request, request_time = line_info
-                if request not in requests:
-                    requests[request] = [request_time]
-                else:
-                    requests[request].append(request_time)
-                full_request_time += request_time
-                full_request_cnt += 1
+    if decompressor == "zlib":
+        return None
+    if decompressor == "auto":
+        return next(filter(None, map(shutil.which, GZIP_COMMANDS)), None)
+    command = shutil.which(decompressor)
+    if not command:
+        raise ValueError(f"Утилита распаковки не найдена: {decompressor}")
+    return command
+
+
+def parse_chunk(
+    path: str,
+    start: int,
+    end: int,
+    parse_func: Callable,
+    median_mode: str = MEDIAN_EXACT,
+    normalizer: UrlNormalizer = None,
+    error_limit: ErrorLimit = None,
+) -> ParseResult:
+    """
+    Сбор информации по диапазону байт лога (выполняется в дочернем процессе).
+    :param path: путь до файла
+    :param start: смещение начала диапазона
+    :param end: смещение конца диапазона
+    :param parse_func: функция парсинга строки
+    :param median_mode: режим расчёта медианы: exact или approx
+    :param normalizer: нормализатор url (None - url без изменений)
+    :param error_limit: порог ошибок для досрочной остановки (None - без проверки)
+
+    :return: кортеж аналогичный результату parse_log
+    """
+    return parse_lines(read_chunk(path, start, end), parse_func, median_mode, normalizer, error_limit=error_limit)
+
+
+def parse_chunk_errors(
+    path: str,
+    start: int,
+    end: int,
+    parse_func: Callable,
+    median_mode: str = MEDIAN_EXACT,
+    normalizer: UrlNormalizer = None,
+    error_limit: ErrorLimit = None,
+    track_errors: bool = False,
+) -> Tuple[ParseResult, array]:
+    """
+    Сбор информации по диапазону байт лога с номерами строк с ошибками (выполняется в дочернем процессе).
+    :param path: путь до файла
+    :param start: смещение начала диапазона
+    :param end: смещение конца диапазона
+    :param parse_func: функция парсинга строки
+    :param median_mode: режим расчёта медианы: exact или approx
+    :param normalizer: нормализатор url (None - url без изменений)
+    :param error_limit: порог ошибок для досрочной остановки внутри диапазона (None - без проверки)
+    :param track_errors: сохранять номера строк с ошибками для проверки порога по всему логу
+
+    :return: кортеж аналогичный результату parse_log и номера строк с ошибками внутри диапазона
+    """
+    error_lines = array("q")
+    result = parse_lines(
+        read_chunk(path, start, end),
+        parse_func,
+        median_mode,
+        normalizer,
+        error_limit=error_limit,
+        error_lines=error_lines if track_errors else None,
+    )
+    return result, error_lines
+
+
+def merge_results(results: Iterable[ParseResult], normalizer: UrlNormalizer = None) -> ParseResult:
+    """
+    Объединение частичных результатов парсинга.
+    Результаты объединяются в исходном порядке,
+    поэтому порядок url и request_time совпадает с последовательным парсингом,
+    а суммы request_time в целых миллисекундах не зависят от разбиения на части.
+    :param results: частичные результаты parse_lines
+    :param normalizer: нормализатор url для соблюдения лимита числа url
+
+    :return: кортеж аналогичный результату parse_log
+    """
+    requests, windows = {}, {}
+    full_request_cnt, error_cnt = 0, 0
+    for part_requests, _, part_cnt, part_errors, part_windows in results:
+        for window, stat in part_windows.items():
+            if window not in windows:
+                windows[window] = stat
             else:
-                error_cnt += 1
-    return requests, full_request_time, full_request_cnt, error_cnt
+                windows[window].merge(stat)
+        for request, stat in part_requests.items():
+            if normalizer:
+                request = normalizer.get_key(request, requests)
+            if request not in requests:
+                requests[request] = stat
+            else:
+                requests[request].merge(stat)
+        full_request_cnt += part_cnt
+        error_cnt += part_errors
+    return ParseResult(requests, get_full_time(requests), full_request_cnt, error_cnt, windows)
+
+
+def get_complete_end(path: str, start: int = 0, block_size: int = 65536) -> int:
+    """
+    Поиск конца последней полной строки файла (для дописываемого лога).
+    :param path: путь до файла
+    :param start: смещение, левее которого поиск не ведётся
+    :param block_size: размер блока чтения с конца файла
+
+    :return: смещение сразу после последнего перевода строки или start
+    """
+    end = os.path.getsize(path)
+    with open(path, "rb") as log_file:
+        while end > start:
+            pos = max(end - block_size, start)
+            log_file.seek(pos)
+            found = log_file.read(end - pos).rfind(b"\n")
+            if found != -1:
+                return pos + found + 1
+            end = pos
+    return start
 
 
-def is_already_analyzed(log: Log, report_dir: str) -> bool:
+class LogTail:
     """
-    Проверка на существование отчёта по данному логу.
+    Чтение строк, дописываемых в лог, с учётом ротации.
+    Файл читается от текущей позиции блоками до FOLLOW_READ_SIZE,
+    незавершённая последняя строка откладывается до следующего чтения.
+    Ротация определяется по смене inode файла по пути path (переименование)
+    или по уменьшению его размера (copytruncate): старый файл дочитывается
+    до конца, после чего чтение продолжается с начала нового.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.inode = None
+        self.rest = b""
+
+    def read(self) -> Tuple[List[bytes], bool]:
+        """
+        Чтение новых полных строк.
+
+        :return: lines - прочитанные строки без перевода строки
+                 rotated - флаг ротации (строки относятся к старому файлу,
+                 следующее чтение начнётся с нового файла)
+        """
+        if self.file is None and not self._open():
+            return [], False
+
+        data = self.file.read(FOLLOW_READ_SIZE)
+        if data:
+            lines = (self.rest + data).split(b"\n")
+            self.rest = lines.pop()
+            return lines, False
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return [], False
+        if stat.st_ino == self.inode and stat.st_size >= self.file.tell():
+            return [], False
+
+        lines = [self.rest] if self.rest else []
+        self.close()
+        return lines, True
+
+    def close(self) -> None:
+        """Закрытие текущего файла."""
+        if self.file is not None:
+            self.file.close()
+        self.file, self.inode, self.rest = None, None, b""
+
+    def _open(self) -> bool:
+        """
+        Открытие файла по пути path.
+
+        :return: флаг успешного открытия
+        """
+        try:
+            self.file = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        return True
+
+
+def get_report_path(log: Log, report_dir: str, extension: str = "html") -> str:
+    """
+    Получение пути до файла отчёта по логу.
+    :param log: информация о логе
+    :param report_dir: директория хранения отчётов
+    :param extension: расширение файла
+
+    :return: путь вида report_dir/report-YYYY.MM.DD.extension
+    """
+    return get_period_report_path(log.date.strftime("%Y.%m.%d"), report_dir, extension)
+
+
+def get_period_report_path(period: str, report_dir: str, extension: str = "html") -> str:
+    """
+    Получение пути до файла отчёта за период.
+    :param period: обозначение периода: YYYY.MM.DD, YYYY-Www или YYYY.MM
+    :param report_dir: директория хранения отчётов
+    :param extension: расширение файла
+
+    :return: путь вида report_dir/report-period.extension
+    """
+    return os.path.join(report_dir, "report-" + period + "." + extension)
+
+
+def is_already_analyzed(log: Log, report_dir: str, catalog: LogCatalog = None) -> bool:
+    """
+    Проверка на существование отчёта по данному логу (в любом формате).
     :param log: информация о логе
     :param report_dir: директория хранения отчётов
+    :param catalog: индекс отчётов (None - проверка файлов отчёта по одному)
 
     :return: флаг наличия отчёта
     """
-    path = os.path.join(report_dir, "report-" + log.date.strftime("%Y.%m.%d") + ".html")
-    return os.path.exists(path)
+    if catalog is None:
+        return any(os.path.exists(get_report_path(log, report_dir, extension)) for extension in REPORT_FORMATS)
+    reports = catalog.scan(report_dir, "reports", get_report_entry)
+    return any(os.path.basename(get_report_path(log, report_dir, extension)) in reports for extension in REPORT_FORMATS)
+
+
+def get_report_entry(entry: os.DirEntry) -> bool or None:
+    """
+    Сведения о файле отчёта для индекса отчётов.
+    :param entry: файл директории отчётов
+
+    :return: True для файлов отчётов, None для остальных
+    """
+    return True if entry.name.startswith("report-") else None
+
+
+def load_checkpoint(
+    log: Log,
+    report_dir: str,
+    median_mode: str,
+    normalizer: UrlNormalizer = None,
+    window: str = None,
+    log_format: str = None,
+) -> dict or None:
+    """
+    Чтение контрольной точки инкрементального анализа.
+    Контрольная точка отбрасывается, если она относится к другому файлу,
+    режиму расчёта медианы, настройкам нормализации url, временному окну,
+    формату лога или лог был усечён.
+    :param log: информация о логе
+    :param report_dir: директория хранения отчётов
+    :param median_mode: режим расчёта медианы
+    :param normalizer: нормализатор url
+    :param window: временное окно агрегации
+    :param log_format: nginx log_format строк лога (None - ui_short)
+
+    :return: словарь с ключами offset и result или None
+    """
+    path = get_report_path(log, report_dir, "checkpoint")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as checkpoint_file:
+            checkpoint = pickle.load(checkpoint_file)
+    except Exception as e:
+        logging.error("Невозможно прочитать контрольную точку %s: %s", path, e)
+        return None
+
+    if (
+        checkpoint.get("version") != CHECKPOINT_VERSION
+        or checkpoint["log"] != log.name
+        or checkpoint["median_mode"] != median_mode
+        or checkpoint["normalizer"] != repr(normalizer)
+        or checkpoint["window"] != window
+        or checkpoint["log_format"] != log_format
+        or checkpoint["offset"] > os.path.getsize(os.path.join(log.path, log.name))
+    ):
+        logging.info("Контрольная точка %s устарела и будет перестроена", path)
+        return None
+    return checkpoint
+
+
+def save_checkpoint(
+    log: Log,
+    report_dir: str,
+    offset: int,
+    result: ParseResult,
+    median_mode: str,
+    normalizer: UrlNormalizer = None,
+    window: str = None,
+    log_format: str = None,
+) -> None:
+    """
+    Атомарная запись контрольной точки инкрементального анализа.
+    :param log: информация о логе
+    :param report_dir: директория хранения отчётов
+    :param offset: смещение, до которого лог разобран
+    :param result: накопленный результат parse_log
+    :param median_mode: режим расчёта медианы
+    :param normalizer: нормализатор url
+    :param window: временное окно агрегации
+    :param log_format: nginx log_format строк лога (None - ui_short)
+
+    :return: None
+    """
+    path = get_report_path(log, report_dir, "checkpoint")
+    checkpoint = {
+        "version": CHECKPOINT_VERSION,
+        "log": log.name,
+        "offset": offset,
+        "median_mode": median_mode,
+        "normalizer": repr(normalizer),
+        "window": window,
+        "log_format": log_format,
+        "result": result,
+    }
+    with open(path + ".tmp", "wb") as checkpoint_file:
+        pickle.dump(checkpoint, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
 
 
 def parse_line(line: bytes) -> Tuple[str, float] or None:
     """
-    Парсинг строки лога.
+    Парсинг строки лога формата ui_short за один проход.
+    Строка целиком не декодируется: url извлекается скомпилированным
+    байтовым шаблоном, request_time - из последнего поля строки.
     :param line: строка лога
 
     :return: request - http-запрос
              request_time - длительность обработки запроса
              None - если не удалось распознать строку
     """
-    line = line.decode("utf-8")
-    found = re.search(REF_PATTERN, line)
-    if found:
-        request = found.group(0).split()[1]
-        request_time = float(line.split()[-1])
-        return request, request_time
-    return None
+    found = REF_PATTERN.search(line)
+    if not found:
+        return None
+    try:
+        request = found.group(1).decode("utf-8")
+        try:
+            request_time = float(line[line.rindex(b" ") + 1 :])
+        except ValueError:
+            request_time = float(line.split()[-1])
+    except ValueError:
+        return None
+    return request, request_time
+
+
+class TimeWindowParser:
+    """
+    Парсер строки, дополнительно возвращающий временное окно запроса.
+    Окно берётся из префикса $time_local без strptime: префикс сравнивается
+    с предыдущим, и ключ окна пересобирается только при его смене.
+    """
+
+    def __init__(self, window: str, parse_func: Callable = None):
+        if window not in WINDOWS:
+            raise ValueError(f"Неизвестное временное окно: {window}")
+        self.window = window
+        self.parse_func = parse_func or parse_line
+        self.width = WINDOWS[window]
+        self.last_stamp = None
+        self.last_key = None
+
+    def __call__(self, line: bytes) -> Tuple[str, float, str] or Tuple[str, float] or None:
+        """
+        Парсинг строки лога.
+        :param line: строка лога
+
+        :return: request, request_time и окно вида YYYY-MM-DD HH:MM,
+                 без окна - если $time_local не распознан,
+                 None - если не удалось распознать строку
+        """
+        line_info = self.parse_func(line)
+        if not line_info:
+            return None
+        start = line.find(b"[") + 1
+        stamp = line[start : start + self.width]
+        if stamp != self.last_stamp:
+            self.last_stamp, self.last_key = stamp, self.get_window_key(stamp)
+        if self.last_key is None:
+            return line_info
+        return line_info[0], line_info[1], self.last_key
+
+    def get_window_key(self, stamp: bytes) -> str or None:
+        """
+        Преобразование префикса $time_local в ключ окна.
+        :param stamp: префикс вида dd/Mon/yyyy:HH или dd/Mon/yyyy:HH:MM
 
+        :return: ключ вида YYYY-MM-DD HH:MM или None
+        """
+        month = MONTHS.get(stamp[3:6])
+        if len(stamp) != self.width or not month or stamp[2:3] != b"/" or stamp[6:7] != b"/":
+            return None
+        minute = stamp[15:17].decode() if self.window == "minute" else "00"
+        return f"{stamp[7:11].decode()}-{month}-{stamp[0:2].decode()} {stamp[12:14].decode()}:{minute}"
 
-def calc_stat(requests: dict, full_time: float, full_cnt: int) -> List[dict]:
+
+def calc_percentiles(stat: UrlStat, percentiles: Iterable[float]) -> dict:
+    """
+    Вычисление колонок перцентилей request_time.
+    :param stat: агрегат request_time
+    :param percentiles: перцентили в диапазоне (0, 100)
+
+    :return: словарь вида time_p90: значение
+    """
+    percentiles = tuple(percentiles)
+    if not percentiles:
+        return {}
+    values = stat.quantiles([percentile / 100 for percentile in percentiles])
+    return {f"time_p{percentile:g}": round(value, 3) for percentile, value in zip(percentiles, values)}
+
+
+def calc_window_stat(windows: Dict[str, UrlStat], percentiles: Iterable[float] = ()) -> List[dict]:
+    """
+    Вычисление показателей по временным окнам.
+    :param windows: словарь вида окно: агрегат request_time
+    :param percentiles: дополнительные перцентили request_time
+
+    :return: список с показателями по каждому окну в порядке времени
+    """
+    return [
+        {
+            "window": window,
+            "count": stat.count,
+            "time_sum": round(stat.time_sum, 3),
+            "time_avg": stat.time_avg,
+            "time_max": round(stat.time_max, 3),
+            "time_med": round(stat.median(), 3),
+            **calc_percentiles(stat, percentiles),
+        }
+        for window, stat in sorted(windows.items())
+    ]
+
+
+def calc_stat(
+    requests: dict, full_time: float, full_cnt: int, report_size: int = None, percentiles: Iterable[float] = ()
+) -> List[dict]:
     """
     Вычисление статистических показателей
     и подготовка результирующих данных.
-    :param requests: словарь вида url-запрос: список request_time
+    При заданном report_size url с наибольшим суммарным временем отбираются
+    через кучу за O(n log k), и медиана считается только для них.
+    :param requests: словарь вида url-запрос: агрегат request_time
     :param full_time: общая длительность выполнения запросов
     :param full_cnt: общее количество выполненных запросов
+    :param report_size: число url в отчёте (None - все url в исходном порядке)
+    :param percentiles: дополнительные перцентили request_time, например (90, 95, 99)
 
-    :return: список с показателями по каждому url
+    :return: список с показателями по каждому url,
+             при заданном report_size - по убыванию time_sum
     """
     stat = []
 
@@ -157,40 +1129,578 @@ def calc_stat(requests: dict, full_time: float, full_cnt: int) -> List[dict]:
         logging.info("Не найдено ни одной записи в логе. Анализ остановлен.")
         return stat
 
-    for request, times in requests.items():
-        time_sum = sum(times)
+    items = requests.items()
+    if report_size is not None:
+        items = heapq.nlargest(report_size, items, key=lambda item: item[1].time_sum)
+
+    for request, url_stat in items:
         stat.append(
             {
                 "url": request,
-                "count": len(times),
-                "count_perc": round(100 * len(times) / full_cnt, 3),
-                "time_sum": round(time_sum, 3),
-                "time_perc": round(100 * time_sum / full_time, 3),
-                "time_avg": round(time_sum / len(times), 3),
-                "time_max": round(max(times), 3),
-                "time_med": round(statistics.median(times), 3),
+                "count": url_stat.count,
+                "count_perc": round(100 * url_stat.count / full_cnt, 3),
+                "time_sum": round(url_stat.time_sum, 3),
+                "time_perc": round(100 * url_stat.time_sum / full_time, 3),
+                "time_avg": url_stat.time_avg,
+                "time_max": round(url_stat.time_max, 3),
+                "time_med": round(url_stat.median(), 3),
+                **calc_percentiles(url_stat, percentiles),
             }
         )
     return stat
 
 
-def save_report(log: namedtuple, report: List[dict], report_dir: str, report_size: int) -> None:
+def save_report(
+    log: namedtuple, report: List[dict], report_dir: str, report_size: int, formats: Iterable[str] = ("html",)
+) -> None:
     """
-    Запись отчёта в html.
+    Запись отчёта в заданных форматах.
+    Каждый файл сначала пишется во временный и затем атомарно переименовывается,
+    чтобы читатели не видели недописанный отчёт.
     :param log: информация о файле логирования
     :param report: сформированный отчёт
     :param report_dir: директория для записи отчёта
     :param report_size: максимальный размер отчёта
+    :param formats: форматы отчёта: html, jsonl, csv, col
+
+    :return: None
+    """
+    write_report(report, log.date.strftime("%Y.%m.%d"), report_dir, report_size, formats)
+
+
+def write_report(
+    report: List[dict], period: str, report_dir: str, report_size: int, formats: Iterable[str] = ("html",)
+) -> None:
+    """
+    Запись отчёта за период в заданных форматах.
+    :param report: сформированный отчёт
+    :param period: обозначение периода (см. get_period_report_path)
+    :param report_dir: директория для записи отчёта
+    :param report_size: максимальный размер отчёта
+    :param formats: форматы отчёта: html, jsonl, csv, col, pages
 
     :return: None
     """
     report.sort(key=lambda x: x["time_sum"], reverse=True)
-    with open(os.path.join(report_dir, "report.html")) as template:
-        template = template.read()
-    report = re.sub(r"\$table_json", json.dumps(report[:report_size]), template)
+    report = report[:report_size]
+
+    for report_format in formats:
+        path = get_period_report_path(period, report_dir, report_format)
+        if report_format == "html":
+            write_html(report, path + ".tmp", os.path.join(report_dir, "report.html"))
+        else:
+            REPORT_WRITERS[report_format](report, path + ".tmp")
+        replace_report(path + ".tmp", path)
+
+
+def replace_report(tmp_path: str, path: str) -> None:
+    """
+    Замена файла (или директории постраничного отчёта) отчёта на новую версию.
+    Директория не может быть атомарно заменена непустой, поэтому
+    старая версия сначала переименовывается и удаляется после замены.
+    :param tmp_path: путь до записанной новой версии
+    :param path: путь до отчёта
+
+    :return: None
+    """
+    if os.path.isdir(path):
+        os.replace(path, path + ".old")
+        os.replace(tmp_path, path)
+        shutil.rmtree(path + ".old")
+    else:
+        os.replace(tmp_path, path)
+
+
+def save_window_report(log: Log, report: List[dict], report_dir: str, formats: Iterable[str] = ("jsonl",)) -> None:
+    """
+    Запись показателей по временным окнам в файлы report-YYYY.MM.DD.windows.*
+    Используются машиночитаемые форматы из formats, при их отсутствии - jsonl.
+    :param log: информация о файле логирования
+    :param report: показатели по окнам
+    :param report_dir: директория для записи отчёта
+    :param formats: форматы отчёта
+
+    :return: None
+    """
+    formats = [report_format for report_format in formats if report_format in REPORT_WRITERS] or ["jsonl"]
+    for report_format in formats:
+        path = get_report_path(log, report_dir, "windows." + report_format)
+        REPORT_WRITERS[report_format](report, path + ".tmp")
+        replace_report(path + ".tmp", path)
+
+
+def get_normalizer(config: dict) -> UrlNormalizer or None:
+    """
+    Создание нормализатора url по конфигурации.
+    :param config: словарь конфигурации
+
+    :return: нормализатор или None, если нормализация отключена
+    """
+    if not (config["URL_STRIP_QUERY"] or config["URL_COLLAPSE_IDS"] or config["URL_MAX_KEYS"]):
+        return None
+    return UrlNormalizer(config["URL_STRIP_QUERY"], config["URL_COLLAPSE_IDS"], config["URL_MAX_KEYS"])
+
+
+def analyze_log(log: Log, config: dict, jobs: int = 1) -> bool:
+    """
+    Построение и сохранение отчёта по логу.
+    При METRICS = true рядом с отчётом сохраняются метрики запуска
+    report-YYYY.MM.DD.metrics.json, при PROFILE = true - профиль cProfile
+    report-YYYY.MM.DD.prof (только основной процесс).
+    :param log: информация о логе
+    :param config: словарь конфигурации
+    :param jobs: количество процессов для парсинга лога
+
+    :return: флаг сохранения отчёта
+    """
+    metrics = Metrics()
+    metrics.set("log", log.name)
+    metrics.set("started", datetime.now().isoformat(timespec="seconds"))
+    metrics.set("jobs", jobs)
+    profiler = cProfile.Profile() if config["PROFILE"] else None
+    if profiler:
+        profiler.enable()
+    try:
+        saved = analyze_log_stages(log, config, jobs, metrics)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(get_report_path(log, config["REPORT_DIR"], "prof"))
+    metrics.set("saved", saved)
+    if config["METRICS"]:
+        metrics.save(get_report_path(log, config["REPORT_DIR"], "metrics.json"))
+    logging.info("Метрики анализа %s: %s", log.name, metrics.to_dict())
+    return saved
+
+
+def analyze_log_stages(log: Log, config: dict, jobs: int, metrics: Metrics) -> bool:
+    """
+    Этапы анализа лога с замером времени: sample, parse, stat, render.
+    :param log: информация о логе
+    :param config: словарь конфигурации
+    :param jobs: количество процессов для парсинга лога
+    :param metrics: метрики запуска
+
+    :return: флаг сохранения отчёта
+    """
+    normalizer = get_normalizer(config)
+    parse_func = get_parse_func(config)
+    if config["ERROR_SAMPLE"]:
+        with metrics.stage("sample"):
+            error_perc = sample_error_perc(log, parse_func, config["ERROR_SAMPLE"], config["GZIP_DECOMPRESSOR"])
+        if error_perc is not None and error_perc > config["ERROR_PERC_LIMIT"]:
+            logging.info(
+                "Превышение порога ошибок парсинга по выборке: %s %% > %s %%. Анализ остановлен",
+                round(error_perc, 1),
+                config["ERROR_PERC_LIMIT"],
+            )
+            return False
+
+    error_limit = ErrorLimit(config["ERROR_PERC_LIMIT"], config["ERROR_MIN_LINES"])
+    try:
+        with metrics.stage("parse"):
+            if config["INCREMENTAL"] and not log.is_gz:
+                result = update_checkpoint(
+                    log, config["REPORT_DIR"], parse_func, jobs, config["MEDIAN_MODE"], normalizer, error_limit
+                )
+            else:
+                result = parse_log(
+                    log,
+                    parse_func,
+                    jobs,
+                    config["MEDIAN_MODE"],
+                    config["GZIP_DECOMPRESSOR"],
+                    normalizer,
+                    error_limit,
+                    metrics,
+                )
+    except ErrorLimitExceeded as e:
+        logging.info("Превышение порога ошибок парсинга (%s): разбор лога %s остановлен досрочно", e, log.name)
+        metrics.set("lines", e.line_cnt)
+        metrics.set("errors", e.error_cnt)
+        return False
+    if result is None:
+        logging.info("Новых записей в логе %s нет. Анализ остановлен.", log.name)
+        return False
+    set_result_metrics(metrics, log, result)
+    return save_result(log, result, config, metrics)
 
-    with open(os.path.join(report_dir, "report-" + log.date.strftime("%Y.%m.%d") + ".html"), "w") as report_file:
-        report_file.write(report)
+
+def set_result_metrics(metrics: Metrics, log: Log, result: ParseResult) -> None:
+    """
+    Запись счётчиков по результату разбора лога.
+    :param metrics: метрики запуска
+    :param log: информация о логе
+    :param result: результат разбора лога
+
+    :return: None
+    """
+    metrics.set("bytes", os.path.getsize(os.path.join(log.path, log.name)))
+    metrics.set("lines", result.full_cnt + result.error_cnt)
+    metrics.set("parsed", result.full_cnt)
+    metrics.set("errors", result.error_cnt)
+    metrics.set("urls", len(result.requests))
+    if result.windows:
+        metrics.set("windows", len(result.windows))
+
+
+def get_catalog(config: dict) -> LogCatalog or None:
+    """
+    Индекс логов и отчётов по конфигурации.
+    :param config: словарь конфигурации
+
+    :return: индекс, сохраняемый в LOG_CATALOG, или None, если индекс не используется
+    """
+    return LogCatalog(config["LOG_CATALOG"]) if config.get("LOG_CATALOG") else None
+
+
+def get_parse_func(config: dict) -> Callable:
+    """
+    Выбор функции парсинга строки по конфигурации.
+    :param config: словарь конфигурации
+
+    :return: парсер по формату LOG_FORMAT или parse_line,
+             с разбивкой по временным окнам, если задан WINDOW
+    """
+    parse_func = LogFormatParser(config["LOG_FORMAT"]) if config.get("LOG_FORMAT") else parse_line
+    return TimeWindowParser(config["WINDOW"], parse_func) if config["WINDOW"] else parse_func
+
+
+def save_result(log: Log, result: ParseResult, config: dict, metrics: Metrics = None) -> bool:
+    """
+    Расчёт показателей по результату парсинга и сохранение отчётов.
+    :param log: информация о логе
+    :param result: результат парсинга лога
+    :param config: словарь конфигурации
+    :param metrics: метрики запуска: время этапов stat (включая медиану и перцентили) и render
+
+    :return: флаг сохранения отчёта
+    """
+    metrics = metrics or Metrics()
+    with metrics.stage("stat"):
+        report = calc_stat(
+            result.requests, result.full_time, result.full_cnt, config["REPORT_SIZE"], config["PERCENTILES"]
+        )
+    metrics.set("report_rows", min(len(report), config["REPORT_SIZE"]))
+    error_perc = get_error_perc(result)
+    if error_perc > config["ERROR_PERC_LIMIT"]:
+        logging.info(
+            "Превышение порога ошибок парсинга: %s %% > %s %%. Анализ остановлен",
+            round(error_perc, 1),
+            config["ERROR_PERC_LIMIT"],
+        )
+        return False
+
+    if report:
+        with metrics.stage("render"):
+            save_report(log, report, config["REPORT_DIR"], config["REPORT_SIZE"], config["REPORT_FORMATS"])
+        if result.windows:
+            with metrics.stage("windows"):
+                window_report = calc_window_stat(result.windows, config["PERCENTILES"])
+                save_window_report(log, window_report, config["REPORT_DIR"], config["REPORT_FORMATS"])
+        if config["DAILY_AGGREGATES"]:
+            with metrics.stage("daily"):
+                save_daily(log, result, config["REPORT_DIR"])
+        return True
+    return False
+
+
+def save_daily(log: Log, result: ParseResult, report_dir: str) -> None:
+    """
+    Атомарная запись агрегатов по логу в report-YYYY.MM.DD.agg для построения сводных отчётов.
+    :param log: информация о логе
+    :param result: результат парсинга лога
+    :param report_dir: директория хранения отчётов
+
+    :return: None
+    """
+    path = get_report_path(log, report_dir, "agg")
+    write_daily(path + ".tmp", result.requests, result.full_time, result.full_cnt, result.error_cnt)
+    os.replace(path + ".tmp", path)
+
+
+def get_daily_aggregates(report_dir: str, catalog: LogCatalog = None) -> List[Tuple[datetime, str]]:
+    """
+    Получение файлов агрегатов за день в директории отчётов.
+    :param report_dir: директория хранения отчётов
+    :param catalog: индекс файлов (None - чтение директории целиком)
+
+    :return: список пар (дата, путь) по возрастанию даты
+    """
+    if catalog is None:
+        found = ((name, match_daily(name)) for name in os.listdir(report_dir))
+    else:
+        found = catalog.scan(report_dir, "daily", lambda entry: match_daily(entry.name)).items()
+    return sorted((date, os.path.join(report_dir, name)) for name, date in found if date)
+
+
+def match_daily(name: str) -> datetime or None:
+    """
+    Разбор имени файла агрегатов за день.
+    :param name: имя файла
+
+    :return: дата агрегатов или None, если файл не является файлом агрегатов
+    """
+    found = re.match(DAILY_PATTERN, name)
+    return datetime.strptime(found.group("date"), "%Y.%m.%d") if found else None
+
+
+def rollup(config: dict, period: str) -> List[str]:
+    """
+    Построение сводных отчётов за неделю или месяц по сохранённым агрегатам за день.
+    Исходные логи не читаются: агрегаты объединяются слиянием скетчей,
+    поэтому медиана и перцентили сводного отчёта приближённые.
+    :param config: словарь конфигурации
+    :param period: период сводного отчёта: week или month
+
+    :return: обозначения периодов построенных отчётов
+    """
+    if period not in ROLLUP_PERIODS:
+        raise ValueError(f"Неизвестный период сводного отчёта: {period}")
+    periods = {}
+    for date, path in get_daily_aggregates(config["REPORT_DIR"]):
+        periods.setdefault(date.strftime(ROLLUP_PERIODS[period]), []).append(path)
+
+    for name, paths in periods.items():
+        result = ParseResult({}, 0, 0, 0, {})
+        for path in paths:
+            requests, _, full_cnt, error_cnt = read_daily(path, result.requests)
+            result = ParseResult(requests, 0, result.full_cnt + full_cnt, result.error_cnt + error_cnt, {})
+        report = calc_stat(
+            result.requests,
+            get_full_time(result.requests),
+            result.full_cnt,
+            config["REPORT_SIZE"],
+            config["PERCENTILES"],
+        )
+        write_report(report, name, config["REPORT_DIR"], config["REPORT_SIZE"], config["REPORT_FORMATS"])
+        logging.info("Сводный отчёт за %s построен по %i дн.", name, len(paths))
+    return list(periods)
+
+
+def backfill_log(log: Log, config: dict) -> bool:
+    """
+    Обработка одного лога в пуле процессов дозаполнения отчётов.
+    :param log: информация о логе
+    :param config: словарь конфигурации
+
+    :return: флаг сохранения отчёта
+    """
+    try:
+        return analyze_log(log, config)
+    except Exception as e:
+        logging.exception("Ошибка обработки лога %s: %s, %s", log.name, type(e), e.args)
+        return False
+
+
+def backfill(config: dict) -> None:
+    """
+    Построение отчётов по всем логам, для которых отчёт ещё не сформирован.
+    Логи обрабатываются параллельно в пуле из JOBS процессов, каждый процесс
+    разбирает по одному логу и перезапускается после него,
+    поэтому память ограничена JOBS одновременно обрабатываемыми логами.
+    :param config: словарь конфигурации
+
+    :return: None
+    """
+    catalog = get_catalog(config)
+    logs = get_logs(config["LOG_DIR"], catalog)
+    logs = [log for log in logs if not is_already_analyzed(log, config["REPORT_DIR"], catalog)]
+    if catalog:
+        catalog.save()
+    if not logs:
+        logging.info("Отсутствуют логи без отчётов. Анализ остановлен.")
+        return
+
+    logging.info("Логов без отчётов: %i", len(logs))
+    with Pool(min(config["JOBS"], len(logs)), maxtasksperchild=1) as pool:
+        saved = pool.map(partial(backfill_log, config=config), logs, chunksize=1)
+    logging.info("Сформировано отчётов: %i из %i", sum(saved), len(logs))
+
+
+def get_sources(patterns: Iterable[str]) -> List[str]:
+    """
+    Получение директорий-источников логов по списку путей и glob-шаблонов.
+    :param patterns: пути или шаблоны директорий, например /mnt/nginx-*/log/
+
+    :return: отсортированный список канонических путей существующих директорий без повторов
+             (одна директория, заданная разными путями, учитывается один раз)
+    """
+    sources = set()
+    for pattern in patterns:
+        sources.update(os.path.realpath(path) for path in glob.glob(pattern) if os.path.isdir(path))
+    return sorted(sources)
+
+
+def get_source_logs(sources: Iterable[str], catalog: LogCatalog = None) -> Tuple[datetime or None, List[Log or str]]:
+    """
+    Поиск последней даты среди источников и данных за неё в каждом источнике.
+    Источник может содержать исходные логи интерфейса или готовые агрегаты
+    за день report-YYYY.MM.DD.agg (частичные результаты, собранные на хосте);
+    при наличии обоих за одну дату используется лог.
+    :param sources: директории-источники
+    :param catalog: индекс логов (None - чтение директорий целиком)
+
+    :return: date - последняя дата (None, если данных нет)
+             items - по одному элементу на источник с данными за дату:
+             Log для лога или путь до файла агрегатов
+    """
+    by_source = []
+    for source in sources:
+        items = {date: path for date, path in get_daily_aggregates(source, catalog)}
+        items.update((log.date, log) for log in get_logs(source, catalog))
+        by_source.append(items)
+    dates = [date for items in by_source for date in items]
+    if not dates:
+        return None, []
+    date = max(dates)
+    return date, [items[date] for items in by_source if date in items]
+
+
+def parse_source(item: Log or str, config: dict) -> ParseResult or None:
+    """
+    Разбор данных одного источника (выполняется в дочернем процессе).
+    :param item: лог или путь до файла агрегатов за день
+    :param config: словарь конфигурации
+
+    :return: результат разбора или None, если источник пропущен из-за ошибок
+    """
+    if isinstance(item, str):
+        return ParseResult(*read_daily(item), {})
+    error_limit = ErrorLimit(config["ERROR_PERC_LIMIT"], config["ERROR_MIN_LINES"])
+    try:
+        return parse_log(
+            item,
+            get_parse_func(config),
+            1,
+            config["MEDIAN_MODE"],
+            config["GZIP_DECOMPRESSOR"],
+            get_normalizer(config),
+            error_limit,
+        )
+    except ErrorLimitExceeded as e:
+        logging.info("Превышение порога ошибок парсинга (%s): лог %s пропущен", e, os.path.join(item.path, item.name))
+        return None
+
+
+def analyze_sources(config: dict) -> bool:
+    """
+    Построение общего отчёта по нескольким источникам (например, nginx-фронтендам)
+    за последнюю дату. Источники разбираются параллельно в пуле из JOBS процессов,
+    агрегаты по url объединяются слиянием UrlStat, поэтому исходные логи
+    и готовые агрегаты хостов смешиваются в одном отчёте.
+    :param config: словарь конфигурации
+
+    :return: флаг сохранения отчёта
+    """
+    sources = get_sources(config["LOG_SOURCES"])
+    catalog = get_catalog(config)
+    date, items = get_source_logs(sources, catalog)
+    log = Log(date, "combined", "", False)
+    analyzed = date is not None and is_already_analyzed(log, config["REPORT_DIR"], catalog)
+    if catalog:
+        catalog.save()
+    if date is None:
+        logging.info("Отсутствуют логи для обработки в источниках %s. Анализ остановлен.", ", ".join(sources))
+        return False
+    if analyzed:
+        logging.info("Общий отчёт за %s уже существует. Анализ остановлен.", date.date())
+        return False
+
+    logging.info("Общий отчёт за %s по %i из %i источников", date.date(), len(items), len(sources))
+    metrics = Metrics()
+    metrics.set("sources", len(items))
+    with metrics.stage("parse"):
+        if config["JOBS"] > 1 and len(items) > 1:
+            with Pool(min(config["JOBS"], len(items)), maxtasksperchild=1) as pool:
+                results = pool.map(partial(parse_source, config=config), items, chunksize=1)
+        else:
+            results = [parse_source(item, config) for item in items]
+        results = [result for result in results if result is not None]
+        if not results:
+            return False
+        result = merge_results(results, get_normalizer(config))
+    metrics.set("lines", result.full_cnt + result.error_cnt)
+    metrics.set("urls", len(result.requests))
+    saved = save_result(log, result, config, metrics)
+    if config["METRICS"]:
+        metrics.save(get_report_path(log, config["REPORT_DIR"], "metrics.json"))
+    return saved
+
+
+def find_rotated_log(log_dir: str, inode: int) -> Log or None:
+    """
+    Поиск лога, в который был переименован отслеживаемый файл при ротации.
+    :param log_dir: директория чтения логов
+    :param inode: inode отслеживаемого файла
+
+    :return: информация о логе или None, если файл сжат или удалён
+    """
+    for log in get_logs(log_dir):
+        try:
+            if not log.is_gz and os.stat(os.path.join(log_dir, log.name)).st_ino == inode:
+                return log
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def get_follow_log(log_dir: str) -> Log:
+    """
+    Информация о текущем (не ротированном) логе, отчёт по которому строится на сегодняшнюю дату.
+    :param log_dir: директория чтения логов
+
+    :return: информация о логе
+    """
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    return Log(today, FOLLOW_LOG_NAME, log_dir, False)
+
+
+def follow(config: dict, stop: threading.Event = None, poll_interval: float = FOLLOW_POLL_INTERVAL) -> None:
+    """
+    Отслеживание дописываемого лога FOLLOW_LOG_NAME в LOG_DIR.
+    Новые строки добавляются к агрегатам в памяти без перечитывания файла,
+    отчёт переписывается не чаще раза в FOLLOW_INTERVAL секунд.
+    При ротации отчёт по старому файлу сохраняется под датой ротированного лога
+    (как в пакетном режиме), и агрегаты начинаются заново.
+    :param config: словарь конфигурации
+    :param stop: событие остановки (None - до прерывания процесса)
+    :param poll_interval: пауза при отсутствии новых строк, секунды
+
+    :return: None
+    """
+    stop = stop or threading.Event()
+    normalizer = get_normalizer(config)
+    parse_func = get_parse_func(config)
+    tail = LogTail(os.path.join(config["LOG_DIR"], FOLLOW_LOG_NAME))
+    log, result, changed = get_follow_log(config["LOG_DIR"]), None, False
+    saved_at = time.monotonic()
+    logging.info("Отслеживание лога %s", tail.path)
+    try:
+        while not stop.is_set():
+            inode = tail.inode
+            lines, rotated = tail.read()
+            if lines:
+                result = parse_lines(lines, parse_func, config["MEDIAN_MODE"], normalizer, result)
+                changed = True
+
+            if rotated:
+                rotated_log = find_rotated_log(config["LOG_DIR"], inode) or log
+                logging.info("Ротация лога %s: отчёт сохраняется за %s", tail.path, rotated_log.date.date())
+                if result is not None:
+                    save_result(rotated_log, result, config)
+                log, result, changed = get_follow_log(config["LOG_DIR"]), None, False
+                parse_func = get_parse_func(config)
+            elif changed and time.monotonic() - saved_at >= config["FOLLOW_INTERVAL"]:
+                save_result(log, result, config)
+                changed, saved_at = False, time.monotonic()
+
+            if not lines and not rotated:
+                stop.wait(poll_interval)
+    finally:
+        tail.close()
+        if changed:
+            save_result(log, result, config)
 
 
 def set_config(args, conf_default: dict) -> dict:
@@ -202,10 +1712,32 @@ def set_config(args, conf_default: dict) -> dict:
 
     :return: словарь конфигурации с ключами:
              LOG_DIR - директория чтения логов
+             LOG_SOURCES - директории или glob-шаблоны источников для общего отчёта через запятую
              REPORT_DIR - директория записей отчёта
              REPORT_SIZE - предельный размер отчёта
              ERROR_PERC_LIMIT - предельный % ошибок
              LOG_FILE_PATH - путь до файла с логом
+             JOBS - количество процессов для парсинга лога
+             MEDIAN_MODE - режим расчёта медианы: exact или approx
+             INCREMENTAL - дозапись отчёта по несжатому логу от контрольной точки
+             BACKFILL - построение отчётов по всем логам без отчёта
+             GZIP_DECOMPRESSOR - способ распаковки *.gz логов: zlib, auto или имя утилиты
+             URL_STRIP_QUERY - отбрасывание query string в url
+             URL_COLLAPSE_IDS - замена числовых и UUID сегментов url на плейсхолдеры
+             URL_MAX_KEYS - предельное число различных url (0 - без ограничения)
+             REPORT_FORMATS - форматы отчёта через запятую: html, jsonl, csv, col, pages
+             WINDOW - временное окно разбивки статистики: minute, hour или пусто
+             PERCENTILES - перцентили request_time через запятую
+             FOLLOW - отслеживание дописываемого лога с периодической перезаписью отчёта
+             FOLLOW_INTERVAL - период перезаписи отчёта в режиме FOLLOW, секунды
+             DAILY_AGGREGATES - сохранение агрегатов за день для сводных отчётов
+             ROLLUP - построение сводных отчётов: week, month или пусто
+             ERROR_MIN_LINES - минимум строк для досрочной остановки по ERROR_PERC_LIMIT
+             ERROR_SAMPLE - размер предварительной выборки строк для оценки ошибок (0 - без выборки)
+             METRICS - сохранение метрик запуска report-YYYY.MM.DD.metrics.json
+             PROFILE - сохранение профиля cProfile report-YYYY.MM.DD.prof
+             LOG_FORMAT - nginx log_format строк лога (пусто - ui_short)
+             LOG_CATALOG - путь до индекса логов и отчётов (пусто - без индекса)
     """
     try:
         conf = configparser.ConfigParser()
@@ -217,15 +1749,68 @@ def set_config(args, conf_default: dict) -> dict:
         log_dir = conf.get("LOG_DIR", conf_default["LOG_DIR"])
         err_perc_limit = float(conf.get("ERROR_PERC_LIMIT", conf_default["ERROR_PERC_LIMIT"]))
         log_file_path = conf.get("LOG_FILE_PATH", conf_default["LOG_FILE_PATH"])
+        jobs = int(conf.get("JOBS", args.jobs or conf_default["JOBS"]))
+        median_mode = conf.get("MEDIAN_MODE", conf_default["MEDIAN_MODE"])
+        if median_mode not in MEDIAN_MODES:
+            raise ValueError(f"Неизвестный режим расчёта медианы: {median_mode}")
+        incremental = conf.getboolean("INCREMENTAL", conf_default["INCREMENTAL"])
+        decompressor = conf.get("GZIP_DECOMPRESSOR", conf_default["GZIP_DECOMPRESSOR"])
+        strip_query = conf.getboolean("URL_STRIP_QUERY", conf_default["URL_STRIP_QUERY"])
+        collapse_ids = conf.getboolean("URL_COLLAPSE_IDS", conf_default["URL_COLLAPSE_IDS"])
+        max_keys = int(conf.get("URL_MAX_KEYS", conf_default["URL_MAX_KEYS"]))
+        report_formats = conf.get("REPORT_FORMATS", ",".join(conf_default["REPORT_FORMATS"]))
+        report_formats = tuple(name.strip() for name in report_formats.split(",") if name.strip())
+        if not report_formats or set(report_formats) - set(REPORT_FORMATS):
+            raise ValueError(f"Неизвестные форматы отчёта: {report_formats}")
+        window = conf.get("WINDOW", conf_default["WINDOW"]) or None
+        if window and window not in WINDOWS:
+            raise ValueError(f"Неизвестное временное окно: {window}")
+        percentiles = conf.get("PERCENTILES", ",".join(map(str, conf_default["PERCENTILES"])))
+        percentiles = tuple(float(value) for value in percentiles.split(",") if value.strip())
+        if any(not 0 < percentile < 100 for percentile in percentiles):
+            raise ValueError(f"Перцентили должны быть в диапазоне (0, 100): {percentiles}")
+        follow_mode = conf.getboolean("FOLLOW", args.follow or conf_default["FOLLOW"])
+        follow_interval = float(conf.get("FOLLOW_INTERVAL", conf_default["FOLLOW_INTERVAL"]))
+        daily_aggregates = conf.getboolean("DAILY_AGGREGATES", conf_default["DAILY_AGGREGATES"])
+        rollup_period = conf.get("ROLLUP", args.rollup or conf_default["ROLLUP"]) or None
+        if rollup_period and rollup_period not in ROLLUP_PERIODS:
+            raise ValueError(f"Неизвестный период сводного отчёта: {rollup_period}")
+        error_min_lines = int(conf.get("ERROR_MIN_LINES", conf_default["ERROR_MIN_LINES"]))
+        error_sample = int(conf.get("ERROR_SAMPLE", conf_default["ERROR_SAMPLE"]))
+        metrics_mode = conf.getboolean("METRICS", conf_default["METRICS"])
+        profile_mode = conf.getboolean("PROFILE", args.profile or conf_default["PROFILE"])
+        log_sources = conf.get("LOG_SOURCES", ",".join(conf_default["LOG_SOURCES"]))
+        log_sources = tuple(source.strip() for source in log_sources.split(",") if source.strip())
+        log_format = conf.get("LOG_FORMAT", conf_default["LOG_FORMAT"]) or None
+        if log_format:
+            LogFormatParser(log_format)
+        log_catalog = conf.get("LOG_CATALOG", conf_default["LOG_CATALOG"]) or None
+        backfill_mode = conf.getboolean("BACKFILL", args.backfill or conf_default["BACKFILL"])
 
     except Exception as e:
         logging.exception("Возникло исключение при чтении конфигурационного файла %s, %s", type(e), e.args)
         sys.exit(1)
 
     logging.info("Директория чтения логов: %s", log_dir)
+    logging.info("Источники общего отчёта: %s", ", ".join(log_sources) or "-")
     logging.info("Директория записи отчётов: %s", report_dir)
     logging.info("Предельный размер отчёта: %i", report_size)
     logging.info("Предельный %% ошибок: %.1f", err_perc_limit)
+    logging.info("Ошибки: досрочная остановка от %i строк, выборка %i строк", error_min_lines, error_sample)
+    logging.info("Количество процессов парсинга: %i", jobs)
+    logging.info("Режим расчёта медианы: %s", median_mode)
+    logging.info("Инкрементальный анализ: %s", incremental)
+    logging.info("Дозаполнение отчётов: %s", backfill_mode)
+    logging.info("Распаковка *.gz логов: %s", decompressor)
+    logging.info("Нормализация url: query %s, id %s, лимит %i", strip_query, collapse_ids, max_keys)
+    logging.info("Форматы отчёта: %s", ", ".join(report_formats))
+    logging.info("Временное окно: %s", window)
+    logging.info("Отслеживание лога: %s, период отчёта %.0f с", follow_mode, follow_interval)
+    logging.info("Агрегаты за день: %s, сводный отчёт: %s", daily_aggregates, rollup_period)
+    logging.info("Метрики запуска: %s, профилирование: %s", metrics_mode, profile_mode)
+    logging.info("Формат лога: %s", log_format or "ui_short")
+    logging.info("Индекс логов: %s", log_catalog or "-")
+    logging.info("Перцентили: %s", ", ".join(f"{percentile:g}" for percentile in percentiles))
 
     config = {
         "LOG_DIR": log_dir,
@@ -233,6 +1818,28 @@ def set_config(args, conf_default: dict) -> dict:
         "REPORT_SIZE": report_size,
         "ERROR_PERC_LIMIT": err_perc_limit,
         "LOG_FILE_PATH": log_file_path,
+        "JOBS": jobs,
+        "MEDIAN_MODE": median_mode,
+        "INCREMENTAL": incremental,
+        "BACKFILL": backfill_mode,
+        "GZIP_DECOMPRESSOR": decompressor,
+        "URL_STRIP_QUERY": strip_query,
+        "URL_COLLAPSE_IDS": collapse_ids,
+        "URL_MAX_KEYS": max_keys,
+        "REPORT_FORMATS": report_formats,
+        "WINDOW": window,
+        "PERCENTILES": percentiles,
+        "FOLLOW": follow_mode,
+        "FOLLOW_INTERVAL": follow_interval,
+        "DAILY_AGGREGATES": daily_aggregates,
+        "ROLLUP": rollup_period,
+        "ERROR_MIN_LINES": error_min_lines,
+        "ERROR_SAMPLE": error_sample,
+        "METRICS": metrics_mode,
+        "PROFILE": profile_mode,
+        "LOG_SOURCES": log_sources,
+        "LOG_FORMAT": log_format,
+        "LOG_CATALOG": log_catalog,
     }
 
     return config
@@ -241,6 +1848,11 @@ def set_config(args, conf_default: dict) -> dict:
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("-config", "--config_file_path", type=str, help="Configuration file path: ./config.ini")
+    parser.add_argument("-j", "--jobs", type=int, help="Parsing processes for uncompressed logs: 4")
+    parser.add_argument("-b", "--backfill", action="store_true", help="Build reports for all unreported logs")
+    parser.add_argument("-r", "--rollup", choices=tuple(ROLLUP_PERIODS), help="Build week / month rollup reports")
+    parser.add_argument("-p", "--profile", action="store_true", help="Dump cProfile stats next to the report")
+    parser.add_argument("-f", "--follow", action="store_true", help="Follow the current log and rewrite the report")
     args = parser.parse_args()
     return args
 
@@ -257,24 +1869,37 @@ def main():
         filename=config["LOG_FILE_PATH"],
     )
     try:
-        log = get_last_log(config["LOG_DIR"])
+        if config["ROLLUP"]:
+            rollup(config, config["ROLLUP"])
+            return
+        if config["BACKFILL"]:
+            backfill(config)
+            return
+        if config["FOLLOW"]:
+            try:
+                follow(config)
+            except KeyboardInterrupt:
+                logging.info("Отслеживание лога остановлено.")
+            return
+
+        if config["LOG_SOURCES"]:
+            analyze_sources(config)
+            return
+
+        catalog = get_catalog(config)
+        log = get_last_log(config["LOG_DIR"], catalog)
+        analyzed = (
+            log and (log.is_gz or not config["INCREMENTAL"]) and is_already_analyzed(log, config["REPORT_DIR"], catalog)
+        )
+        if catalog:
+            catalog.save()
 
         if not log:
             logging.info("Отсутствуют логи для обработки. Анализ остановлен.")
-        elif is_already_analyzed(log, config["REPORT_DIR"]):
+        elif analyzed:
             logging.info("Отчёт по последнему логу уже существует. Анализ остановлен.")
         else:
-            report, error_perc = get_report(log)
-
-            if error_perc > config["ERROR_PERC_LIMIT"]:
-                logging.info(
-                    "Превышение порога ошибок парсинга: %s %% > %s %%. Анализ остановлен",
-                    round(error_perc, 1),
-                    config["ERROR_PERC_LIMIT"],
-                )
-
-            if report:
-                save_report(log, report, config["REPORT_DIR"], config["REPORT_SIZE"])
+            analyze_log(log, config, config["JOBS"])
 
     except Exception as e:
         logging.exception("Необработанное исключение %s, %s", type(e), e.args)
@@ -0,0 +1,121 @@
+import re
+from typing import List, Tuple
+
+UI_SHORT_FORMAT = (
+    '$remote_addr  $remote_user $http_x_real_ip [$time_local] "$request" '
+    '$status $body_bytes_sent "$http_referer" '
+    '"$http_user_agent" "$http_x_forwarded_for" "$http_X_REQUEST_ID" "$http_X_RB_USER" '
+    "$request_time"
+)
+URL_VARIABLES = ("request", "request_uri", "uri")
+TIME_VARIABLE = "request_time"
+VARIABLE = re.compile(r"\$(?:\{(\w+)\}|(\w+))")
+
+
+class LogFormatParser:
+    """
+    Парсер строки лога, скомпилированный из nginx log_format.
+    Формат превращается в один байтовый шаблон, который сопоставляется
+    с началом строки и захватывает только поля отчёта (url и request_time):
+    разбор останавливается после последнего нужного поля, остальные поля
+    проходятся без захвата по символу-разделителю. Если $request_time
+    последнее поле формата, оно берётся из последнего поля строки, как в parse_line.
+    Пробелы в формате допускают любое их число в строке.
+    """
+
+    def __init__(self, log_format: str):
+        self.log_format = log_format
+        self.pattern, self.url_group, self.time_group = compile_log_format(log_format)
+
+    def __call__(self, line: bytes) -> Tuple[str, float] or None:
+        """
+        Парсинг строки лога.
+        :param line: строка лога
+
+        :return: request - url запроса
+                 request_time - длительность обработки запроса
+                 None - если не удалось распознать строку
+        """
+        found = self.pattern.match(line)
+        if not found:
+            return None
+        try:
+            request = found.group(self.url_group).decode("utf-8")
+            if self.time_group:
+                request_time = float(found.group(self.time_group))
+            else:
+                try:
+                    request_time = float(line[line.rindex(b" ") + 1 :])
+                except ValueError:
+                    request_time = float(line.split()[-1])
+        except ValueError:
+            return None
+        return request, request_time
+
+    def __repr__(self) -> str:
+        return f"LogFormatParser({self.log_format!r})"
+
+
+def split_log_format(log_format: str) -> List[Tuple[str, str]]:
+    """
+    Разбиение nginx log_format на литералы и переменные.
+    :param log_format: строка формата, например '$remote_addr [$time_local] "$request"'
+
+    :return: список пар (литерал перед переменной, имя переменной), у последней пары
+             имя переменной пустое, если формат заканчивается литералом
+    """
+    parts, pos = [], 0
+    for found in VARIABLE.finditer(log_format):
+        parts.append((log_format[pos : found.start()], found.group(1) or found.group(2)))
+        pos = found.end()
+    if pos < len(log_format):
+        parts.append((log_format[pos:], ""))
+    return parts
+
+
+def compile_log_format(log_format: str) -> Tuple[re.Pattern, int, int]:
+    """
+    Компиляция nginx log_format в байтовый шаблон.
+    :param log_format: строка формата
+
+    :return: pattern - шаблон, сопоставляемый с началом строки
+             url_group - номер группы url
+             time_group - номер группы request_time (0 - последнее поле строки)
+    """
+    parts = split_log_format(log_format)
+    names = [name for _, name in parts]
+    url_name = next((name for name in URL_VARIABLES if name in names), None)
+    if url_name is None:
+        raise ValueError(f"В формате лога нет url: {', '.join('$' + name for name in URL_VARIABLES)}")
+    if TIME_VARIABLE not in names:
+        raise ValueError(f"В формате лога нет ${TIME_VARIABLE}")
+
+    time_last = names[-1] == TIME_VARIABLE and names.count(TIME_VARIABLE) == 1
+    needed = {url_name} if time_last else {url_name, TIME_VARIABLE}
+    last = max(i for i, name in enumerate(names) if name in needed)
+
+    regex, groups, group = [], {}, 0
+    for i, (literal, name) in enumerate(parts[: last + 1]):
+        regex.append(compile_literal(literal))
+        following = parts[i + 1][0] if i + 1 < len(parts) else ""
+        stop = re.escape(following[:1]).encode() if following else b""
+        field = b"[^" + stop + b"\\n]*" if stop else b".*?"
+        if name in needed and name not in groups:
+            group += 1
+            groups[name] = group
+            if name == "request":
+                field = b"[A-Z]+ +([^ " + stop + b"\\n]+)" + (b"[^" + stop + b"\\n]*" if stop and i < last else b"")
+            else:
+                field = b"(" + field + b")"
+        regex.append(field)
+    return re.compile(b"".join(regex)), groups[url_name], 0 if time_last else groups[TIME_VARIABLE]
+
+
+def compile_literal(literal: str) -> bytes:
+    """
+    Шаблон литерала формата: пробелы допускают любое их число.
+    :param literal: литерал формата
+
+    :return: байтовый шаблон
+    """
+    return b" +".join(re.escape(part).encode() for part in re.split(" +", literal))
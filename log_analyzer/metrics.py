@@ -0,0 +1,70 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class Metrics:
+    """
+    Метрики одного запуска анализа: время этапов и счётчики.
+    Время этапа накапливается, поэтому этап может выполняться несколько раз.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.values: Dict[str, object] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Замер времени этапа.
+        :param name: название этапа
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """
+        Добавление времени к этапу.
+        :param name: название этапа
+        :param seconds: длительность, секунды
+        """
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add(self, name: str, value: float) -> None:
+        """
+        Увеличение счётчика.
+        :param name: название метрики
+        :param value: приращение
+        """
+        self.values[name] = self.values.get(name, 0) + value
+
+    def set(self, name: str, value) -> None:
+        """
+        Запись значения метрики.
+        :param name: название метрики
+        :param value: значение (сериализуемое в JSON)
+        """
+        self.values[name] = value
+
+    def to_dict(self) -> dict:
+        """
+        Метрики в виде словаря.
+
+        :return: словарь со временем этапов (stages), их суммой (total) и значениями метрик
+        """
+        stages = {name: round(seconds, 6) for name, seconds in self.stages.items()}
+        return {"stages": stages, "total": round(sum(self.stages.values()), 6), **self.values}
+
+    def save(self, path: str) -> None:
+        """
+        Атомарная запись метрик в JSON.
+        :param path: путь до файла метрик
+        """
+        with open(path + ".tmp", "w") as metrics_file:
+            json.dump(self.to_dict(), metrics_file, indent=2)
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,53 @@
+import re
+
+OVERFLOW_URL = "__other__"
+ID_PLACEHOLDER = "{id}"
+UUID_PLACEHOLDER = "{uuid}"
+
+UUID_SEGMENT = re.compile(r"(?<=/)[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}(?=[/?]|$)")
+ID_SEGMENT = re.compile(r"(?<=/)\d+(?=[/?]|$)")
+
+
+class UrlNormalizer:
+    """
+    Нормализация url перед агрегацией для ограничения числа ключей:
+    отбрасывание query string, замена числовых и UUID сегментов пути
+    на плейсхолдеры и ограничение числа различных url (лишние url
+    учитываются в общей корзине OVERFLOW_URL).
+    """
+
+    def __init__(self, strip_query: bool = False, collapse_ids: bool = False, max_keys: int = 0):
+        self.strip_query = strip_query
+        self.collapse_ids = collapse_ids
+        self.max_keys = max_keys
+
+    def __call__(self, url: str) -> str:
+        """
+        Нормализация url.
+        :param url: исходный url
+
+        :return: нормализованный url
+        """
+        if self.strip_query:
+            url = url.partition("?")[0]
+        if self.collapse_ids:
+            url = ID_SEGMENT.sub(ID_PLACEHOLDER, UUID_SEGMENT.sub(UUID_PLACEHOLDER, url))
+        return url
+
+    def __repr__(self) -> str:
+        return (
+            f"UrlNormalizer(strip_query={self.strip_query}, collapse_ids={self.collapse_ids}, "
+            f"max_keys={self.max_keys})"
+        )
+
+    def get_key(self, url: str, keys: dict) -> str:
+        """
+        Получение ключа агрегации с учётом ограничения числа url.
+        :param url: нормализованный url
+        :param keys: уже накопленные агрегаты по url
+
+        :return: url или OVERFLOW_URL, если лимит ключей исчерпан
+        """
+        if not self.max_keys or url in keys or len(keys) < self.max_keys:
+            return url
+        return OVERFLOW_URL
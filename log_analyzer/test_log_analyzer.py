@@ -1,10 +1,22 @@
+import csv
+import gzip
+import json
 import os
 import shutil
+import threading
+import time
 import unittest
 
 from datetime import datetime
 
+import benchmark
 import log_analyzer
+from aggregate import QuantileSketch, UrlStat
+from catalog import LogCatalog
+from daily import read_daily
+from log_format import UI_SHORT_FORMAT, LogFormatParser
+from normalizer import OVERFLOW_URL, UrlNormalizer
+from writers import read_columnar
 
 
 class TestLogAnalyzer(unittest.TestCase):
@@ -53,6 +65,445 @@ class TestLogAnalyzer(unittest.TestCase):
         self.assertEqual(datetime(2021, 9, 29), log.date)
         self.assertListEqual(self.expected_report, report)
 
+    def test_parallel_parse(self):
+        log = log_analyzer.get_last_log(self.log_dir)
+        report, error_perc = log_analyzer.get_report(log, jobs=3)
+        self.assertListEqual(self.expected_report, report)
+
+    def test_parallel_parse_generated(self):
+        benchmark.generate_log(self.log_dir + 'nginx-access-ui.log-20211001', 50000, urls=300, error_rate=0.01)
+        log = log_analyzer.get_last_log(self.log_dir)
+        report, error_perc = log_analyzer.get_report(log)
+        for jobs in (2, 4, 7):
+            self.assertEqual((report, error_perc), log_analyzer.get_report(log, jobs=jobs))
+
+    def test_get_chunks(self):
+        path = self.log_dir + 'nginx-access-ui.log-20210929'
+        chunks = log_analyzer.get_chunks(path, 4)
+        self.assertEqual(0, chunks[0][0])
+        self.assertEqual(os.path.getsize(path), chunks[-1][1])
+        with open(path, 'rb') as log_file:
+            lines = log_file.readlines()
+        chunk_lines = [line for start, end in chunks for line in log_analyzer.read_chunk(path, start, end)]
+        self.assertListEqual(lines, chunk_lines)
+        self.assertListEqual([], list(log_analyzer.read_chunk(path, 10, 10)))
+
+    def test_top_report(self):
+        log = log_analyzer.get_last_log(self.log_dir)
+        report, error_perc = log_analyzer.get_report(log, report_size=2)
+        expected = sorted(self.expected_report, key=lambda row: row['time_sum'], reverse=True)[:2]
+        self.assertListEqual(expected, report)
+
+    def test_approx_median(self):
+        log = log_analyzer.get_last_log(self.log_dir)
+        report, error_perc = log_analyzer.get_report(log, median_mode='approx')
+        self.assertListEqual(self.expected_report, report)
+
+    def test_incremental_report(self):
+        log = log_analyzer.Log(datetime(2021, 10, 1), 'nginx-access-ui.log-20211001', self.log_dir, None)
+        lines = self.log_fst.split('\n')
+        with open(self.log_dir + log.name, 'w') as log_file:
+            log_file.write('\n'.join(lines[:3]) + '\n' + lines[3][:20])
+
+        report, error_perc = log_analyzer.get_incremental_report(log, self.report_dir)
+        self.assertEqual(3, sum(row['count'] for row in report))
+
+        with open(self.log_dir + log.name, 'a') as log_file:
+            log_file.write(lines[3][20:] + '\n' + '\n'.join(lines[4:]) + '\n')
+        report, error_perc = log_analyzer.get_incremental_report(log, self.report_dir)
+        self.assertListEqual(log_analyzer.get_report(log)[0], report)
+
+        open(log_analyzer.get_report_path(log, self.report_dir), 'w').close()
+        self.assertIsNone(log_analyzer.get_incremental_report(log, self.report_dir))
+
+    def test_backfill(self):
+        with open(self.log_dir + 'nginx-access-ui.log-20210930.gz', 'wb') as log_file:
+            log_file.write(gzip.compress(self.log_fst.encode()))
+        with open(self.report_dir + 'report.html', 'w') as template:
+            template.write('var table = $table_json;')
+        open(self.report_dir + 'report-2021.09.29.html', 'w').close()
+        config = dict(log_analyzer.default_config, LOG_DIR=self.log_dir, REPORT_DIR=self.report_dir, JOBS=2)
+
+        self.assertListEqual(['nginx-access-ui.log-20210929', 'nginx-access-ui.log-20210930.gz'],
+                             [log.name for log in log_analyzer.get_logs(self.log_dir)])
+        log_analyzer.backfill(config)
+        with open(self.report_dir + 'report-2021.09.30.html') as report_file:
+            self.assertIn('/api/v2/slot/4705/groups', report_file.read())
+        with open(self.report_dir + 'report-2021.09.29.html') as report_file:
+            self.assertEqual('', report_file.read())
+
+    def test_read_gzip(self):
+        path = self.log_dir + 'nginx-access-ui.log-20210930.gz'
+        with open(path, 'wb') as log_file:
+            log_file.write(gzip.compress(self.log_fst.encode()) + gzip.compress(b'\n' + self.log_fst.encode()))
+        with gzip.open(path, 'rb') as log_file:
+            expected = [line.rstrip(b'\n') for line in log_file]
+        self.assertListEqual(expected, list(log_analyzer.read_gzip(path, block_size=64)))
+        self.assertListEqual(expected, list(log_analyzer.read_gzip(path, 'auto', block_size=64)))
+
+        data = gzip.compress(self.log_fst.encode() * 50)
+        with open(path, 'wb') as log_file:
+            log_file.write(data[:len(data) // 2])
+        with self.assertRaises(EOFError):
+            list(log_analyzer.read_gzip(path, block_size=64))
+        with self.assertRaises((EOFError, OSError)):
+            list(log_analyzer.read_gzip(path, 'auto', block_size=64))
+
+    def test_report_formats(self):
+        log = log_analyzer.get_last_log(self.log_dir)
+        report, error_perc = log_analyzer.get_report(log)
+        with open(self.report_dir + 'report.html', 'w') as template:
+            template.write('var table = $table_json;')
+        log_analyzer.save_report(log, report, self.report_dir, 3, ('html', 'jsonl', 'csv', 'col'))
+        expected = sorted(self.expected_report, key=lambda row: row['time_sum'], reverse=True)[:3]
+
+        with open(self.report_dir + 'report-2021.09.29.jsonl') as report_file:
+            self.assertListEqual(expected, [json.loads(line) for line in report_file])
+        with open(self.report_dir + 'report-2021.09.29.csv') as report_file:
+            rows = list(csv.DictReader(report_file))
+        self.assertListEqual([row['url'] for row in expected], [row['url'] for row in rows])
+        self.assertEqual('0.348', rows[1]['time_avg'])
+        columns = read_columnar(self.report_dir + 'report-2021.09.29.col')
+        self.assertListEqual(expected, [dict(zip(columns, values)) for values in zip(*columns.values())])
+        self.assertTrue(os.path.exists(self.report_dir + 'report-2021.09.29.html'))
+
+    def test_report_pages(self):
+        with open(self.report_dir + 'report.html', 'w') as template:
+            template.write('var table = $table_json;')
+        report = [{'url': f'/api/{i}\\d', 'count': i, 'time_sum': float(i)} for i in range(2500)]
+        log = log_analyzer.get_last_log(self.log_dir)
+        for _ in range(2):
+            log_analyzer.save_report(log, list(report), self.report_dir, 2500, ('html', 'pages'))
+
+        expected = sorted(report, key=lambda row: row['time_sum'], reverse=True)
+        with open(self.report_dir + 'report-2021.09.29.html') as report_file:
+            self.assertEqual(expected, json.loads(report_file.read()[len('var table = '):-1]))
+        pages_dir = self.report_dir + 'report-2021.09.29.pages/'
+        self.assertListEqual(['00000.js', '00001.js', '00002.js'], sorted(os.listdir(pages_dir + 'pages')))
+        with open(pages_dir + 'pages/00002.js') as page_file:
+            page = page_file.read()
+        self.assertTrue(page.startswith('report_page(2, '))
+        self.assertEqual(expected[2000:], json.loads(page[len('report_page(2, '):-3]))
+        with open(pages_dir + 'index.html') as index_file:
+            self.assertIn('"rows": 2500, "pages": 3', index_file.read())
+        self.assertTrue(log_analyzer.is_already_analyzed(log, self.report_dir))
+
+    def test_time_windows(self):
+        lines = [
+            b'1.1.1.1 -  - [29/Jun/2017:03:50:22 +0300] "GET /api/1 HTTP/1.1" 200 9 "-" "-" "-" "-" "-" 0.100',
+            b'1.1.1.1 -  - [29/Jun/2017:03:50:59 +0300] "GET /api/2 HTTP/1.1" 200 9 "-" "-" "-" "-" "-" 0.300',
+            b'1.1.1.1 -  - [29/Jun/2017:03:51:00 +0300] "GET /api/1 HTTP/1.1" 200 9 "-" "-" "-" "-" "-" 0.500',
+            b'1.1.1.1 -  - [29/Jun/2017:04:10:00 +0300] "GET /api/1 HTTP/1.1" 200 9 "-" "-" "-" "-" "-" 0.700',
+        ]
+        parser = log_analyzer.TimeWindowParser('minute')
+        self.assertEqual(('/api/1', 0.1, '2017-06-29 03:50'), parser(lines[0]))
+        result = log_analyzer.parse_lines(lines, parser)
+        self.assertListEqual(['2017-06-29 03:50', '2017-06-29 03:51', '2017-06-29 04:10'], list(result.windows))
+        self.assertEqual(3, result.requests['/api/1'].count)
+
+        result = log_analyzer.parse_lines(lines, log_analyzer.TimeWindowParser('hour'))
+        rows = log_analyzer.calc_window_stat(result.windows)
+        self.assertListEqual([{'window': '2017-06-29 03:00', 'count': 3, 'time_sum': 0.9, 'time_avg': 0.3,
+                               'time_max': 0.5, 'time_med': 0.3},
+                              {'window': '2017-06-29 04:00', 'count': 1, 'time_sum': 0.7, 'time_avg': 0.7,
+                               'time_max': 0.7, 'time_med': 0.7}], rows)
+        self.assertEqual(('/api/1', 0.1), parser(lines[0].replace(b'Jun', b'Foo')))
+
+    def test_rollup(self):
+        with open(self.log_dir + 'nginx-access-ui.log-20210930', 'w') as log_file:
+            log_file.write(self.log_fst)
+        config = dict(log_analyzer.default_config, LOG_DIR=self.log_dir, REPORT_DIR=self.report_dir,
+                      REPORT_FORMATS=('jsonl',))
+        for log in log_analyzer.get_logs(self.log_dir):
+            log_analyzer.analyze_log(log, config)
+
+        requests, full_time, full_cnt, error_cnt = read_daily(self.report_dir + 'report-2021.09.29.agg')
+        self.assertEqual((6, 0), (full_cnt, error_cnt))
+        self.assertEqual(2, requests['/api/v2/group/'].count)
+        self.assertAlmostEqual(0.628, requests['/api/v2/group/'].time_max)
+        self.assertAlmostEqual(0.704, requests['/api/v2/slot/4705/groups'].median(), delta=0.704 * 0.01)
+
+        self.assertListEqual(['2021-W39'], log_analyzer.rollup(config, 'week'))
+        self.assertListEqual(['2021.09'], log_analyzer.rollup(config, 'month'))
+        with open(self.report_dir + 'report-2021-W39.jsonl') as report_file:
+            rows = {row['url']: row for row in map(json.loads, report_file)}
+        self.assertEqual(4, rows['/api/v2/group/']['count'])
+        self.assertEqual(1.39, rows['/api/v2/group/']['time_sum'])
+        self.assertTrue(os.path.exists(self.report_dir + 'report-2021.09.jsonl'))
+
+    def test_error_limit(self):
+        log = log_analyzer.Log(datetime(2021, 10, 1), 'nginx-access-ui.log-20211001', self.log_dir, None)
+        with open(self.log_dir + log.name, 'w') as log_file:
+            log_file.write(self.log_fst + '\n' + 'broken line\n' * 5000)
+        error_limit = log_analyzer.ErrorLimit(50, 100)
+        for jobs in (1, 2):
+            with self.assertRaises(log_analyzer.ErrorLimitExceeded) as raised:
+                log_analyzer.parse_log(log, log_analyzer.parse_line, jobs, error_limit=error_limit)
+            self.assertLess(raised.exception.line_cnt, 200)
+
+        self.assertEqual(0, log_analyzer.sample_error_perc(log_analyzer.get_logs(self.log_dir)[0],
+                                                           log_analyzer.parse_line, 100))
+        self.assertGreater(log_analyzer.sample_error_perc(log, log_analyzer.parse_line, 100, seed=1), 50)
+        config = dict(log_analyzer.default_config, LOG_DIR=self.log_dir, REPORT_DIR=self.report_dir,
+                      REPORT_FORMATS=('jsonl',), ERROR_MIN_LINES=100)
+        self.assertFalse(log_analyzer.analyze_log(log, dict(config, ERROR_SAMPLE=100)))
+        self.assertFalse(log_analyzer.analyze_log(log, config))
+        self.assertFalse(os.path.exists(self.report_dir + 'report-2021.10.01.jsonl'))
+
+        log = log_analyzer.Log(datetime(2021, 10, 2), 'nginx-access-ui.log-20211002', self.log_dir, None)
+        path = self.log_dir + log.name
+        for good_first in (True, False):
+            benchmark.generate_log(path, 3000, urls=50)
+            with open(path, 'rb') as log_file:
+                good = log_file.read()
+            with open(path, 'wb') as log_file:
+                log_file.write(good + b'broken line\n' * 1200 if good_first else b'broken line\n' * 1200 + good)
+            outcomes = []
+            for jobs in (1, 4):
+                try:
+                    result = log_analyzer.parse_log(log, log_analyzer.parse_line, jobs, error_limit=error_limit)
+                    outcomes.append((result.full_cnt, result.error_cnt))
+                except log_analyzer.ErrorLimitExceeded as e:
+                    outcomes.append(str(e))
+            self.assertEqual(outcomes[0], outcomes[1])
+            self.assertEqual(good_first, isinstance(outcomes[0], tuple))
+
+    def test_generate_log(self):
+        path = self.log_dir + 'nginx-access-ui.log-20170629'
+        size = benchmark.generate_log(path, 2000, urls=50, error_rate=0.1)
+        benchmark.generate_log(path + '.gz', 2000, urls=50, error_rate=0.1)
+        with open(path, 'rb') as log_file, gzip.open(path + '.gz', 'rb') as gz_file:
+            self.assertEqual(log_file.read(), gz_file.read())
+        self.assertEqual(size, os.path.getsize(path))
+
+        log = log_analyzer.Log(datetime(2017, 6, 29), 'nginx-access-ui.log-20170629', self.log_dir, None)
+        result = log_analyzer.parse_log(log, log_analyzer.parse_line)
+        self.assertEqual(2000, result.full_cnt + result.error_cnt)
+        self.assertAlmostEqual(200, result.error_cnt, delta=50)
+        self.assertLessEqual(len(result.requests), 50)
+
+        stages = benchmark.bench_stages(path, report_size=10)
+        self.assertListEqual(list(benchmark.STAGES), list(stages))
+        self.assertEqual(2000, stages['read']['lines'])
+        self.assertEqual(10, stages['stat']['rows'])
+
+    def test_metrics(self):
+        config = dict(log_analyzer.default_config, LOG_DIR=self.log_dir, REPORT_DIR=self.report_dir,
+                      REPORT_FORMATS=('jsonl',), PROFILE=True)
+        with gzip.open(self.log_dir + 'nginx-access-ui.log-20210930.gz', 'wt') as log_file:
+            log_file.write(self.log_fst)
+        log = log_analyzer.get_last_log(self.log_dir)
+        self.assertTrue(log_analyzer.analyze_log(log, config))
+
+        with open(self.report_dir + 'report-2021.09.30.metrics.json') as metrics_file:
+            metrics = json.load(metrics_file)
+        self.assertListEqual(['parse', 'stat', 'render', 'daily'], list(metrics['stages']))
+        self.assertAlmostEqual(metrics['total'], sum(metrics['stages'].values()), places=5)
+        self.assertEqual((6, 6, 0, 5, 5), (metrics['lines'], metrics['parsed'], metrics['errors'],
+                                           metrics['urls'], metrics['report_rows']))
+        self.assertIn('gzip_wait', metrics)
+        self.assertTrue(metrics['saved'])
+        self.assertTrue(os.path.exists(self.report_dir + 'report-2021.09.30.prof'))
+
+    def test_log_sources(self):
+        for host in ('front1', 'front2', 'front3'):
+            os.makedirs(self.log_dir + host)
+        shutil.copy(self.log_dir + 'nginx-access-ui.log-20210929', self.log_dir + 'front1/')
+        shutil.copy(self.log_dir + 'nginx-access-ui.log-20210929', self.log_dir + 'front3/nginx-access-ui.log-20210928')
+        log = log_analyzer.get_last_log(self.log_dir)
+        result = log_analyzer.parse_log(log, log_analyzer.parse_line)
+        log_analyzer.save_daily(log, result, self.log_dir + 'front2/')
+
+        expected = [os.path.realpath(self.log_dir + host) for host in ('front1', 'front2', 'front3')]
+        sources = log_analyzer.get_sources([self.log_dir + 'front*', self.log_dir + 'front1'])
+        self.assertListEqual(expected, sources)
+        sources = log_analyzer.get_sources([self.log_dir + 'front*/', self.log_dir + 'front1', self.log_dir + '../'
+                                            + os.path.basename(os.path.normpath(self.log_dir)) + '/front2'])
+        self.assertListEqual(expected, sources)
+        date, items = log_analyzer.get_source_logs(sources)
+        self.assertEqual(datetime(2021, 9, 29), date)
+        self.assertEqual(2, len(items))
+
+        config = dict(log_analyzer.default_config, REPORT_DIR=self.report_dir, REPORT_FORMATS=('jsonl',), JOBS=2,
+                      LOG_SOURCES=(self.log_dir + 'front*/', self.log_dir + 'front1'))
+        self.assertTrue(log_analyzer.analyze_sources(config))
+        with open(self.report_dir + 'report-2021.09.29.jsonl') as report_file:
+            rows = {row['url']: row for row in map(json.loads, report_file)}
+        self.assertEqual(4, rows['/api/v2/group/']['count'])
+        self.assertEqual(0.628, rows['/api/v2/group/']['time_max'])
+        self.assertFalse(log_analyzer.analyze_sources(config))
+
+    def test_log_catalog(self):
+        path = self.report_dir + 'catalog'
+        catalog = LogCatalog(path)
+        self.assertListEqual(log_analyzer.get_logs(self.log_dir), log_analyzer.get_logs(self.log_dir, catalog))
+        catalog.save()
+
+        matched = []
+
+        def match(entry):
+            matched.append(entry.name)
+            return log_analyzer.get_log_entry(entry)
+
+        os.utime(self.log_dir, ns=(10 ** 18, 10 ** 18))
+        catalog = LogCatalog(path)
+        self.assertEqual(1, len(catalog.scan(self.log_dir, 'logs', match)))
+        self.assertListEqual([], matched)
+        open(self.log_dir + 'nginx-access-ui.log-20211001', 'w').close()
+        self.assertEqual(2, len(catalog.scan(self.log_dir, 'logs', match)))
+        self.assertListEqual(['nginx-access-ui.log-20211001'], matched)
+
+        log = log_analyzer.get_last_log(self.log_dir, catalog)
+        self.assertEqual(datetime(2021, 10, 1), log.date)
+        self.assertFalse(log_analyzer.is_already_analyzed(log, self.report_dir, catalog))
+        open(log_analyzer.get_report_path(log, self.report_dir, 'jsonl'), 'w').close()
+        self.assertTrue(log_analyzer.is_already_analyzed(log, self.report_dir, catalog))
+
+    def test_log_tail(self):
+        path = self.log_dir + log_analyzer.FOLLOW_LOG_NAME
+        lines = [line.encode() for line in self.log_fst.split('\n')]
+        tail = log_analyzer.LogTail(path)
+        self.assertEqual(([], False), tail.read())
+
+        with open(path, 'wb') as log_file:
+            log_file.write(b'\n'.join(lines[:2]) + b'\n' + lines[2][:10])
+        self.assertEqual((lines[:2], False), tail.read())
+        with open(path, 'ab') as log_file:
+            log_file.write(lines[2][10:] + b'\n' + lines[3])
+        self.assertEqual(([lines[2]], False), tail.read())
+
+        os.rename(path, self.log_dir + 'nginx-access-ui.log-20211001')
+        with open(path, 'wb') as log_file:
+            log_file.write(lines[4] + b'\n')
+        self.assertEqual(([lines[3]], True), tail.read())
+        self.assertEqual(([lines[4]], False), tail.read())
+        tail.close()
+
+    def test_follow(self):
+        path = self.log_dir + log_analyzer.FOLLOW_LOG_NAME
+        config = dict(log_analyzer.default_config, LOG_DIR=self.log_dir, REPORT_DIR=self.report_dir,
+                      REPORT_FORMATS=('jsonl',), FOLLOW_INTERVAL=0)
+        live_report = log_analyzer.get_report_path(log_analyzer.get_follow_log(self.log_dir), self.report_dir, 'jsonl')
+
+        def wait_report(report_path, count):
+            for _ in range(500):
+                if os.path.exists(report_path):
+                    with open(report_path) as report_file:
+                        if sum(json.loads(line)['count'] for line in report_file) == count:
+                            return
+                time.sleep(0.01)
+            self.fail(f'Отчёт {report_path} не сформирован')
+
+        with open(path, 'w') as log_file:
+            log_file.write(self.log_fst + '\n')
+        stop = threading.Event()
+        thread = threading.Thread(target=log_analyzer.follow, args=(config, stop, 0.01))
+        thread.start()
+        try:
+            wait_report(live_report, 6)
+            with open(path, 'a') as log_file:
+                log_file.write(self.log_fst.split('\n')[3] + '\n')
+            wait_report(live_report, 7)
+
+            os.rename(path, self.log_dir + 'nginx-access-ui.log-20211001')
+            with open(path, 'w') as log_file:
+                log_file.write(self.log_fst.split('\n')[4] + '\n')
+            wait_report(self.report_dir + 'report-2021.10.01.jsonl', 7)
+            wait_report(live_report, 1)
+        finally:
+            stop.set()
+            thread.join()
+
+    def test_parse_line(self):
+        with open(self.log_dir + 'nginx-access-ui.log-20210929', 'rb') as log_file:
+            lines = log_file.readlines()
+        for line in lines + benchmark.get_sample_lines(10):
+            self.assertEqual(benchmark.parse_line_legacy(line), log_analyzer.parse_line(line))
+        self.assertIsNone(log_analyzer.parse_line(b'"GET /api/v2/banner HTTP/1.1" 200 - broken'))
+        self.assertIsNone(log_analyzer.parse_line(b'"PUT /api/v2/banner HTTP/1.1" 200 0.1'))
+
+    def test_log_format(self):
+        parse_func = LogFormatParser(UI_SHORT_FORMAT)
+        for line in benchmark.get_sample_lines(10):
+            self.assertEqual(log_analyzer.parse_line(line), parse_func(line))
+        self.assertIsNone(parse_func(b'"GET /api/v2/banner HTTP/1.1" 200 0.1'))
+
+        log_format = '$remote_addr [$time_local] "$request" $status $request_time "$http_user_agent"'
+        lines = ['10.0.0.1 [29/Sep/2021:10:00:01 +0300] "PUT /api/1 HTTP/1.1" 200 0.5 "curl 7"',
+                 '10.0.0.2 [29/Sep/2021:10:00:02 +0300] "GET /api/1 HTTP/1.1" 404 1.5 "-"',
+                 '10.0.0.3 [29/Sep/2021:10:00:03 +0300] "-" 400 0.001 "-"']
+        with open(self.log_dir + 'nginx-access-ui.log-20210930', 'w') as log_file:
+            log_file.write('\n'.join(lines))
+        config = dict(log_analyzer.default_config, LOG_FORMAT=log_format, WINDOW='hour')
+        result = log_analyzer.parse_log(log_analyzer.get_last_log(self.log_dir), log_analyzer.get_parse_func(config))
+        self.assertEqual(2, result.requests['/api/1'].count)
+        self.assertEqual(2.0, result.full_time)
+        self.assertEqual(1, result.error_cnt)
+        self.assertEqual(['2021-09-29 10:00'], list(result.windows))
+        with self.assertRaises(ValueError):
+            LogFormatParser('$remote_addr "$request" $status')
+
+    def test_url_normalizer(self):
+        log = log_analyzer.get_last_log(self.log_dir)
+        normalizer = UrlNormalizer(collapse_ids=True, max_keys=3)
+        report, error_perc = log_analyzer.get_report(log, normalizer=normalizer)
+        self.assertListEqual(['/api/v2', '/api/v2/slot/{id}/groups', '/api/v2/internal/banner/{id}', OVERFLOW_URL],
+                             [row['url'] for row in report])
+        self.assertEqual(3, report[-1]['count'])
+        self.assertListEqual(report, log_analyzer.get_report(log, jobs=3, normalizer=normalizer)[0])
+
+        normalizer = UrlNormalizer(strip_query=True, collapse_ids=True)
+        self.assertEqual('/api/{id}/item/{uuid}', normalizer('/api/42/item/123e4567-e89b-12d3-a456-426614174000?x=1'))
+        self.assertEqual('/api/v2/a1', normalizer('/api/v2/a1'))
+
+        normalizer = UrlNormalizer(collapse_ids=True)
+        self.assertEqual('/api/v2/banner/{id}?x=1', normalizer('/api/v2/banner/123?x=1'))
+        self.assertEqual('/api/{uuid}?x=1', normalizer('/api/123e4567-e89b-12d3-a456-426614174000?x=1'))
+
+
+class TestAggregate(unittest.TestCase):
+
+    def test_url_stat_merge(self):
+        times = [0.5, 0.1, 0.3, 0.9, 0.2]
+        stat, part = UrlStat(), UrlStat()
+        for request_time in times[:2]:
+            stat.add(request_time)
+        for request_time in times[2:]:
+            part.add(request_time)
+        stat.merge(part)
+        self.assertEqual(5, stat.count)
+        self.assertEqual(0.9, stat.time_max)
+        self.assertAlmostEqual(sum(times), stat.time_sum)
+        self.assertEqual(0.3, stat.median())
+
+    def test_sketch_quantile(self):
+        sketch, part = QuantileSketch(), QuantileSketch()
+        for i in range(1, 501):
+            sketch.add(i / 100)
+            part.add((i + 500) / 100)
+        sketch.merge(part)
+        self.assertEqual(1000, sketch.count)
+        self.assertAlmostEqual(5.005, sketch.quantile(0.5), delta=5.005 * 0.01)
+        self.assertAlmostEqual(9.901, sketch.quantile(0.99), delta=9.901 * 0.01)
+
+    def test_approx_switches_to_sketch(self):
+        stat = UrlStat('approx')
+        for i in range(1000):
+            stat.add(i / 1000)
+        self.assertIsNone(stat.times)
+        self.assertAlmostEqual(0.4995, stat.median(), delta=0.4995 * 0.01)
+
+    def test_percentiles(self):
+        exact, approx = UrlStat(), UrlStat('approx')
+        for i in range(1, 1001):
+            exact.add(i / 1000)
+            approx.add(i / 1000)
+        self.assertEqual({'time_p90': 0.9, 'time_p99': 0.99}, log_analyzer.calc_percentiles(exact, (90, 99)))
+        for expected, value in zip((0.9001, 0.99001), approx.quantiles((0.9, 0.99))):
+            self.assertAlmostEqual(expected, value, delta=expected * 0.01)
+        report = log_analyzer.calc_stat({'/api': exact}, exact.time_sum, exact.count, percentiles=(95,))
+        self.assertEqual(0.95, report[0]['time_p95'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,233 @@
+import csv
+import json
+import os
+import shutil
+import struct
+from array import array
+from typing import Dict, Iterable, List, TextIO
+
+from binary import from_le, to_le
+
+COLUMNAR_MAGIC = b"LACOL1\n"
+COLUMN_TYPES = {int: "int", float: "float", str: "str"}
+PAGE_SIZE = 1000
+PAGES_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>rbui log analysis report</title>
+<style>
+body { font-family: sans-serif; font-size: 13px; }
+table { border-collapse: collapse; }
+th, td { border: 1px solid #ccc; padding: 2px 6px; text-align: right; }
+td:first-child { text-align: left; word-break: break-all; max-width: 600px; }
+</style>
+</head>
+<body>
+<p><button id="prev">&larr;</button> <span id="status"></span> <button id="next">&rarr;</button></p>
+<table><thead><tr id="columns"></tr></thead><tbody id="rows"></tbody></table>
+<script>
+var index = $index_json, pages = {}, current = 0;
+function report_page(number, rows) { pages[number] = rows; if (number === current) render(); }
+function load(number) {
+    current = number;
+    if (pages[number]) { render(); return; }
+    document.getElementById("status").textContent = "...";
+    var script = document.createElement("script");
+    script.src = "pages/" + String(number).padStart(5, "0") + ".js";
+    document.body.appendChild(script);
+}
+function render() {
+    var body = document.getElementById("rows"), rows = pages[current];
+    body.innerHTML = "";
+    rows.forEach(function (row) {
+        var tr = document.createElement("tr");
+        index.columns.forEach(function (column) {
+            var td = document.createElement("td");
+            td.textContent = row[column];
+            tr.appendChild(td);
+        });
+        body.appendChild(tr);
+    });
+    document.getElementById("status").textContent =
+        "page " + (current + 1) + " / " + index.pages + " (" + index.rows + " rows)";
+}
+index.columns.forEach(function (column) {
+    var th = document.createElement("th");
+    th.textContent = column;
+    document.getElementById("columns").appendChild(th);
+});
+document.getElementById("prev").onclick = function () { if (current > 0) load(current - 1); };
+document.getElementById("next").onclick = function () { if (current + 1 < index.pages) load(current + 1); };
+if (index.pages) load(0);
+</script>
+</body>
+</html>
+"""
+
+
+def write_html(report: List[dict], path: str, template_path: str) -> None:
+    """
+    Запись отчёта в html по шаблону с подстановкой $table_json.
+    Строки отчёта пишутся в файл по одной, без сборки JSON всей таблицы в памяти.
+    :param report: строки отчёта
+    :param path: путь до файла отчёта
+    :param template_path: путь до шаблона report.html
+
+    :return: None
+    """
+    with open(template_path) as template:
+        template = template.read()
+    head, found, tail = template.partition("$table_json")
+
+    with open(path, "w") as report_file:
+        report_file.write(head)
+        if found:
+            write_json_array(report, report_file)
+            report_file.write(tail.replace("$table_json", json.dumps(report)) if "$table_json" in tail else tail)
+
+
+def write_json_array(rows: Iterable[dict], report_file: TextIO) -> int:
+    """
+    Потоковая запись JSON-массива строк отчёта.
+    :param rows: строки отчёта
+    :param report_file: открытый текстовый файл
+
+    :return: количество записанных строк
+    """
+    count = 0
+    report_file.write("[")
+    for row in rows:
+        if count:
+            report_file.write(", ")
+        report_file.write(json.dumps(row))
+        count += 1
+    report_file.write("]")
+    return count
+
+
+def write_pages(report: List[dict], path: str) -> None:
+    """
+    Запись постраничного html-отчёта для больших REPORT_SIZE.
+    Создаётся директория: index.html со страницей просмотра и pages/NNNNN.js
+    по PAGE_SIZE строк. Страница загружает данные лениво, только для открытой
+    страницы таблицы, через <script> (работает и при открытии с диска).
+    Строки пишутся в файлы страниц по одной.
+    :param report: строки отчёта
+    :param path: путь до директории отчёта
+
+    :return: None
+    """
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(os.path.join(path, "pages"))
+    pages = 0
+    for start in range(0, len(report), PAGE_SIZE):
+        with open(os.path.join(path, "pages", f"{pages:05d}.js"), "w") as page_file:
+            page_file.write(f"report_page({pages}, ")
+            write_json_array(report[start : start + PAGE_SIZE], page_file)
+            page_file.write(");\n")
+        pages += 1
+
+    index = {"rows": len(report), "pages": pages, "page_size": PAGE_SIZE, "columns": list(report[0]) if report else []}
+    with open(os.path.join(path, "index.html"), "w") as index_file:
+        index_file.write(PAGES_TEMPLATE.replace("$index_json", json.dumps(index)))
+
+
+def write_jsonl(report: List[dict], path: str) -> None:
+    """
+    Запись отчёта в формате JSON lines (одна строка отчёта - один объект).
+    :param report: строки отчёта
+    :param path: путь до файла отчёта
+
+    :return: None
+    """
+    with open(path, "w") as report_file:
+        for row in report:
+            report_file.write(json.dumps(row, separators=(",", ":")))
+            report_file.write("\n")
+
+
+def write_csv(report: List[dict], path: str) -> None:
+    """
+    Запись отчёта в CSV с заголовком.
+    :param report: строки отчёта
+    :param path: путь до файла отчёта
+
+    :return: None
+    """
+    with open(path, "w", newline="") as report_file:
+        if not report:
+            return
+        writer = csv.DictWriter(report_file, fieldnames=list(report[0]))
+        writer.writeheader()
+        for row in report:
+            writer.writerow(row)
+
+
+def write_columnar(report: List[dict], path: str) -> None:
+    """
+    Запись отчёта в компактном бинарном колоночном формате.
+    Файл: COLUMNAR_MAGIC, длина заголовка (uint32 LE), JSON-заголовок
+    со схемой колонок, затем данные колонок подряд: int - int64 LE,
+    float - float64 LE, str - смещения uint32 LE (rows + 1) и байты utf-8.
+    :param report: строки отчёта
+    :param path: путь до файла отчёта
+
+    :return: None
+    """
+    names = list(report[0]) if report else []
+    blobs, columns = [], []
+    for name in names:
+        values = [row[name] for row in report]
+        column_type = COLUMN_TYPES[type(values[0])]
+        if column_type == "str":
+            data = [value.encode("utf-8") for value in values]
+            offsets = array("I", [0])
+            for item in data:
+                offsets.append(offsets[-1] + len(item))
+            blob = to_le(offsets) + b"".join(data)
+        else:
+            blob = to_le(array("q" if column_type == "int" else "d", values))
+        columns.append({"name": name, "type": column_type, "size": len(blob)})
+        blobs.append(blob)
+
+    header = json.dumps({"rows": len(report), "columns": columns}).encode()
+    with open(path, "wb") as report_file:
+        report_file.write(COLUMNAR_MAGIC)
+        report_file.write(struct.pack("<I", len(header)))
+        report_file.write(header)
+        for blob in blobs:
+            report_file.write(blob)
+
+
+def read_columnar(path: str) -> Dict[str, list]:
+    """
+    Чтение отчёта в колоночном формате.
+    :param path: путь до файла отчёта
+
+    :return: словарь вида колонка: список значений
+    """
+    with open(path, "rb") as report_file:
+        if report_file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"Файл не является колоночным отчётом: {path}")
+        (header_size,) = struct.unpack("<I", report_file.read(4))
+        header = json.loads(report_file.read(header_size))
+        rows, result = header["rows"], {}
+        for column in header["columns"]:
+            blob = report_file.read(column["size"])
+            if column["type"] == "str":
+                offsets = from_le("I", blob[: 4 * (rows + 1)])
+                data = blob[4 * (rows + 1) :]
+                result[column["name"]] = [data[offsets[i] : offsets[i + 1]].decode("utf-8") for i in range(rows)]
+            else:
+                result[column["name"]] = from_le("q" if column["type"] == "int" else "d", blob).tolist()
+    return result
+
+
+REPORT_WRITERS = {
+    "jsonl": write_jsonl,
+    "csv": write_csv,
+    "col": write_columnar,
+    "pages": write_pages,
+}
+REPORT_FORMATS = ("html", *REPORT_WRITERS)